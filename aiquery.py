@@ -23,43 +23,577 @@
 # SOFTWARE.
 
 import os
+import sys
+import json
 import datetime
 import asyncio
 import re
+import math
 import argparse
 import time
 import logging
-from dotenv import load_dotenv
-from ollama import AsyncClient
-from ddgs import DDGS
-from ddgs.http_client import HttpClient
+import threading
+import contextlib
+import copy
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pocketflow import AsyncNode, AsyncFlow
+from caching import SearchCache, LLMCache, AnswerCache, SessionMemory, is_time_sensitive, normalize_question
+from ranking import clean_snippet, rank_snippets, pack_context, term_coverage, WEATHER_TOKEN, SnippetStore
+from telemetry import Trace, LOG_CONTEXT, LatencyModel, setup_logging
 
-# Silence ddgs impersonation warnings
-HttpClient._impersonates = (None,)
-HttpClient._impersonates_os = (None,)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='aiquery.log',
-    filemode='a'
-)
 logger = logging.getLogger("AiQuery")
 
-# Load environment variables
-load_dotenv()
+# Heavy clients are imported on first use so --help and --version start fast
+AsyncClient = None
+DDGS = None
+
+def load_ollama():
+    """Imports the Ollama AsyncClient on first use."""
+    global AsyncClient
+    if AsyncClient is None:
+        from ollama import AsyncClient as client_class
+        AsyncClient = client_class
+    return AsyncClient
+
+def load_ddgs():
+    """Imports DDGS on first use."""
+    global DDGS
+    if DDGS is None:
+        from ddgs import DDGS as ddgs_class
+        from ddgs.http_client import HttpClient
+        # Silence ddgs impersonation warnings
+        HttpClient._impersonates = (None,)
+        HttpClient._impersonates_os = (None,)
+        DDGS = ddgs_class
+    return DDGS
+
+_runtime_ready = False
+
+def init_runtime(**logging_options):
+    """
+    Loads environment variables and configures logging, once per process.
+    `logging_options` (from the command line) override the AIQUERY_LOG_* settings.
+    """
+    global _runtime_ready
+    if _runtime_ready:
+        return
+    _runtime_ready = True
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+
+    # Log records are written by a background thread, with rotation
+    options = {
+        'path': os.getenv("AIQUERY_LOG_FILE", "aiquery.log"),
+        'level': os.getenv("AIQUERY_LOG_LEVEL", "INFO"),
+        'fmt': os.getenv("AIQUERY_LOG_FORMAT", "text"),
+        'max_bytes': int(os.getenv("AIQUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        'backups': int(os.getenv("AIQUERY_LOG_BACKUPS", "5")),
+        'when': os.getenv("AIQUERY_LOG_ROTATE_WHEN") or None,
+    }
+    options.update({key: value for key, value in logging_options.items() if value is not None})
+    if options['path']:
+        setup_logging(**options)
+
+# Nodes calling the LLM, each of which can run on its own model
+LLM_NODES = ('querygen', 'relevance', 'answer', 'review')
+
+# Prompt context budgets in estimated tokens, per node. Prompt evaluation
+# dominates on CPU-only Ollama, so these keep it short and predictable.
+DEFAULT_CONTEXT_BUDGETS = {'querygen': 256, 'relevance': 1024, 'answer': 1280}
+
+def parse_context_budgets(spec):
+    """
+    Parses "node=tokens" entries separated by commas. An entry can be limited
+    to one model as "model/node=tokens", e.g. "answer=1280,qwen2.5:14b/answer=3000".
+    Returns {(model or None, node): tokens}.
+    """
+    budgets = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        key, _, tokens = entry.partition("=")
+        model, _, node = key.strip().rpartition("/")
+        budgets[(model or None, node)] = int(tokens)
+    return budgets
+
+def parse_relevance_precheck(spec):
+    """
+    Parses AIQUERY_RELEVANCE_PRECHECK "low,high" into (low, high), with
+    0 <= low <= high <= 1. Returns None (precheck off) when empty or invalid.
+    """
+    spec = spec.strip()
+    if not spec:
+        return None
+    try:
+        low, high = (float(x) for x in spec.split(","))
+        if not 0 <= low <= high <= 1:
+            raise ValueError
+    except ValueError:
+        msg = f"[!] Ignoring AIQUERY_RELEVANCE_PRECHECK={spec!r}: expected 'low,high' with 0 <= low <= high <= 1"
+        print(msg)
+        logger.warning(msg)
+        return None
+    return low, high
+
+def parse_deadline(value):
+    """Deadline seconds: a finite, non-negative number (0 means no limit)."""
+    seconds = float(value)
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"deadline must be a finite, non-negative number of seconds, got {value!r}")
+    return seconds
+
+def parse_keep_alive(value):
+    """OLLAMA_KEEP_ALIVE as Ollama accepts it: seconds (-1 keeps the model forever) or a duration like "30m"."""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+# --- LLM Client ---
+
+class _SlotStream:
+    """Streaming response that gives its admission slot back once exhausted or closed."""
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self._stream, 'aclose'):
+                await self._stream.aclose()
+        finally:
+            self._release()
+
+class OllamaClient:
+    """
+    Wraps the Ollama AsyncClient. Nodes pass `node=` so non-streaming calls
+    from the nodes listed in `cache_nodes` can be answered from an LLMCache.
+    At most `max_parallel` calls are in flight at once (a stream holds its
+    slot until it is exhausted or closed); the rest wait their turn here
+    instead of piling up on the Ollama server. `keep_alive` is sent with
+    every call so the model stays loaded between questions.
+    """
+    def __init__(self, client, cache=None, cache_nodes=(), max_parallel=None, keep_alive=None):
+        self.client = client
+        self.keep_alive = keep_alive
+        self.cache = cache
+        self.cache_nodes = set(cache_nodes)
+        self.max_parallel = max_parallel
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_parallel) if max_parallel else None
+
+    async def generate(self, model, prompt, stream=False, node=None, cache=True, **kwargs):
+        # cache=False asks for a fresh reply even when the node's replies are cached
+        use_cache = cache and self.cache is not None and not stream and node in self.cache_nodes
+        if not use_cache:
+            return await self._generate(model=model, prompt=prompt, stream=stream, **kwargs)
+
+        key = LLMCache.make_key(model, prompt, kwargs)
+        if self.cache.persistent:
+            cached = await asyncio.to_thread(self.cache.get, key)
+        else:
+            cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for {node} ({model})")
+            cached['cached'] = True
+            return cached
+
+        response = await self._generate(model=model, prompt=prompt, **kwargs)
+        data = response.model_dump() if hasattr(response, 'model_dump') else dict(response)
+        if self.cache.persistent:
+            await asyncio.to_thread(self.cache.put, key, data)
+        else:
+            self.cache.put(key, data)
+        return response
+
+    async def warm_up(self, model):
+        """Loads `model` without generating anything (Ollama treats an empty prompt as a load request)."""
+        if isinstance(self.client, OllamaHostPool):
+            kwargs = {'keep_alive': self.keep_alive} if self.keep_alive is not None else {}
+            return await self.client.warm_up(model, **kwargs)
+        return await self._generate(model=model, prompt="")
+
+    async def _generate(self, stream=False, **kwargs):
+        if self.keep_alive is not None:
+            kwargs.setdefault('keep_alive', self.keep_alive)
+        await self._acquire()
+        try:
+            response = await self.client.generate(stream=stream, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        if stream:
+            return _SlotStream(response, self._release)
+        self._release()
+        return response
+
+    async def _acquire(self):
+        if self._slots is not None:
+            if self._slots.locked():
+                logger.info(f"Ollama busy ({self.in_flight} in flight), queueing request")
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def __getattr__(self, name):
+        # Everything else (chat, embed, ps, ...) goes straight to Ollama
+        return getattr(self.client, name)
+
+def parse_hosts(value):
+    """OLLAMA_HOST as a list: one or more URLs separated by commas or whitespace."""
+    return [host for host in re.split(r'[,\s]+', value) if host]
+
+def is_host_failure(error):
+    """Whether an Ollama call failed because of the host (unreachable, dropped, 5xx) rather than the request."""
+    import httpx
+    if isinstance(error, (ConnectionError, httpx.TransportError)):
+        return True
+    return (getattr(error, 'status_code', 0) or 0) >= 500
+
+class _PooledHost:
+    """One Ollama server of an OllamaHostPool, with its load and health counters."""
+    def __init__(self, url, client):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def healthy(self, now):
+        return self.ejected_until <= now
+
+    def stats(self):
+        return {
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejections': self.ejections,
+            'healthy': self.healthy(time.monotonic()),
+        }
+
+class OllamaHostPool:
+    """
+    Spreads generate calls over several Ollama servers. Each call goes to the
+    healthy host with the fewest outstanding requests. A host failing
+    `max_failures` times in a row is ejected for `eject_seconds`, after which
+    the next call probes it again; failed calls are retried on other hosts.
+    Streams count as outstanding until exhausted or closed, and are retried
+    only while no chunk has been received.
+    """
+    def __init__(self, clients, max_failures=2, eject_seconds=30.0):
+        self.hosts = [_PooledHost(url, client) for url, client in clients.items()]
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+
+    def pick(self, exclude=()):
+        """Least-loaded healthy host, or the one back soonest if all are ejected."""
+        now = time.monotonic()
+        candidates = [h for h in self.hosts if h not in exclude] or self.hosts
+        healthy = [h for h in candidates if h.healthy(now)]
+        if healthy:
+            return min(healthy, key=lambda h: (h.outstanding, h.requests))
+        return min(candidates, key=lambda h: h.ejected_until)
+
+    def _succeeded(self, host):
+        host.consecutive_failures = 0
+        host.ejected_until = 0.0
+
+    def _failed(self, host, error):
+        host.failures += 1
+        host.consecutive_failures += 1
+        if host.consecutive_failures >= self.max_failures and host.healthy(time.monotonic()):
+            host.ejected_until = time.monotonic() + self.eject_seconds
+            host.ejections += 1
+            logger.warning(f"Ejecting Ollama host {host.url} for {self.eject_seconds:g}s: {error}")
+
+    async def generate(self, stream=False, **kwargs):
+        if stream:
+            return self._stream(kwargs)
+        tried = []
+        while True:
+            host = self.pick(exclude=tried)
+            tried.append(host)
+            host.outstanding += 1
+            host.requests += 1
+            try:
+                response = await host.client.generate(stream=False, **kwargs)
+            except Exception as e:
+                if not is_host_failure(e):
+                    raise
+                self._failed(host, e)
+                if len(tried) >= len(self.hosts):
+                    raise
+                logger.info(f"Ollama host {host.url} failed ({e}), retrying on another host")
+                continue
+            finally:
+                host.outstanding -= 1
+            self._succeeded(host)
+            return response
+
+    async def _stream(self, kwargs):
+        tried = []
+        while True:
+            host = self.pick(exclude=tried)
+            tried.append(host)
+            host.outstanding += 1
+            host.requests += 1
+            stream = None
+            try:
+                # Nothing has been sent to the caller until the first chunk arrives
+                stream = await host.client.generate(stream=True, **kwargs)
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                host.outstanding -= 1
+                self._succeeded(host)
+                return
+            except BaseException as e:
+                # Cancellation too: the host must not keep counting a request nobody waits for
+                host.outstanding -= 1
+                if hasattr(stream, 'aclose'):
+                    with contextlib.suppress(Exception):
+                        await stream.aclose()
+                if not isinstance(e, Exception) or not is_host_failure(e):
+                    raise
+                self._failed(host, e)
+                if len(tried) >= len(self.hosts):
+                    raise
+                logger.info(f"Ollama host {host.url} failed ({e}), retrying stream on another host")
+                continue
+            break
+
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+            self._succeeded(host)
+        except Exception as e:
+            if is_host_failure(e):
+                self._failed(host, e)
+            raise
+        finally:
+            host.outstanding -= 1
+            if hasattr(stream, 'aclose'):
+                await stream.aclose()
+
+    async def warm_up(self, model, **kwargs):
+        """Loads `model` on every host at once. Returns the slowest host's response."""
+        responses = await asyncio.gather(*(
+            h.client.generate(model=model, prompt="", **kwargs) for h in self.hosts
+        ), return_exceptions=True)
+        failures = [r for r in responses if isinstance(r, BaseException)]
+        for host, response in zip(self.hosts, responses):
+            if isinstance(response, BaseException):
+                logger.warning(f"Warm-up of {model} on {host.url} failed: {response}")
+        if len(failures) == len(responses):
+            raise failures[0]
+        loaded = [r for r in responses if not isinstance(r, BaseException)]
+        return max(loaded, key=lambda r: r.get('load_duration') or 0)
+
+    def stats(self):
+        """Per-host load and health counters, by host URL."""
+        return {h.url: h.stats() for h in self.hosts}
+
+    def __getattr__(self, name):
+        # Other API calls (embed, ps, ...) go to the least-loaded healthy host
+        return getattr(self.pick().client, name)
+
+# --- Search Backends ---
+
+class SearchBackend:
+    """Interface for the async web search providers awaited by SearchNode."""
+    async def search(self, query, region='br-pt', max_results=10):
+        """Returns a list of result dicts with at least 'title' and 'body'."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# Seconds a search may outlast its HTTP timeout before the flow stops waiting
+SEARCH_TIMEOUT_GRACE = 1.0
+
+class DDGSBackend(SearchBackend):
+    """
+    DuckDuckGo adapter. The blocking ddgs client runs on a bounded thread pool,
+    so the event loop keeps serving other flows while a search is in flight.
+
+    The client's HTTP requests use `timeout` themselves; the asyncio deadline is
+    a little longer and only stops waiting: a timed-out search keeps its worker
+    thread until the ddgs call returns.
+    """
+    def __init__(self, max_workers=4, timeout=10.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aiquery-search")
+        self._ddgs = None
+        self._lock = threading.Lock()
+
+    def _session(self):
+        # A single DDGS instance is reused: it caches its engines, and each
+        # engine keeps its own HTTP client, so connections survive across searches.
+        with self._lock:
+            if self._ddgs is None:
+                self._ddgs = load_ddgs()(timeout=self.timeout)
+            return self._ddgs
+
+    def _search_sync(self, query, region, max_results):
+        return list(self._session().text(query, region=region, max_results=max_results))
+
+    async def search(self, query, region='br-pt', max_results=10):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._search_sync, query, region, max_results)
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout + SEARCH_TIMEOUT_GRACE)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"search timed out after {self.timeout + SEARCH_TIMEOUT_GRACE}s") from None
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class CachedSearchBackend(SearchBackend):
+    """Serves repeated searches from a SearchCache without touching the network."""
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+
+    async def search(self, query, region='br-pt', max_results=10):
+        # SQLite work happens off the loop, like the searches themselves
+        results = await asyncio.to_thread(self.cache.get, query, region, max_results)
+        if results is not None:
+            logger.info(f"Search cache hit: '{query}'")
+            return results
+        results = await self.backend.search(query, region=region, max_results=max_results)
+        if results:
+            await asyncio.to_thread(self.cache.put, query, region, max_results, results)
+        return results
+
+    def close(self):
+        self.backend.close()
+        self.cache.close()
 
 class SearchBotBase:
     """Base class for shared tools and client initialization."""
     def __init__(self):
+        init_runtime()
         # Load from .env or use defaults
-        self.host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        # One or more Ollama servers, calls are spread over all of them
+        self.hosts = parse_hosts(os.getenv("OLLAMA_HOST", "")) or ["http://localhost:11434"]
+        self.host = self.hosts[0]
         self.model = os.getenv("OLLAMA_MODEL", "llama3.2:1B")
+        # Per-node models (OLLAMA_MODEL_QUERYGEN, ...), e.g. a tiny one for the short classifier replies
+        self.models = {node: os.getenv(f"OLLAMA_MODEL_{node.upper()}") or self.model for node in LLM_NODES}
+        
+        # Number of search queries generated per iteration (1 disables fan-out)
+        self.fanout = int(os.getenv("AIQUERY_FANOUT", "1"))
+        # Searches of one attempt run at the same time (the rest wait their turn)
+        self.search_concurrency = max(1, int(os.getenv("AIQUERY_SEARCH_CONCURRENCY", "3")))
+        # SimHash bits two snippets may differ by and still count as duplicates (negative disables)
+        dedup_distance = int(os.getenv("AIQUERY_DEDUP_DISTANCE", "6"))
+        self.dedup_distance = dedup_distance if dedup_distance >= 0 else None
+        # Start the answer while relevance is checked (pays off on multi-slot Ollama servers)
+        self.speculative = os.getenv("AIQUERY_SPECULATIVE", "false").lower() in ("1", "true", "yes")
+        # Keyword coverage thresholds deciding relevance without the LLM, as "low,high" (empty disables)
+        self.relevance_precheck = parse_relevance_precheck(os.getenv("AIQUERY_RELEVANCE_PRECHECK", ""))
+        # Token budgets for the search results put in each prompt, optionally per model
+        self.context_budgets = parse_context_budgets(os.getenv("AIQUERY_CONTEXT_BUDGETS", ""))
+        # Seconds a question may take (empty or 0: no limit), planned with the node timings seen so far
+        self.deadline = parse_deadline(os.getenv("AIQUERY_DEADLINE") or 0) or None
+        self.latency = LatencyModel()
         
-        # Initialize the Ollama client
-        self.client = AsyncClient(host=self.host)
+        # Initialize the Ollama client, with a response cache for the short classifier prompts
+        cache_nodes = [n.strip() for n in os.getenv("AIQUERY_LLM_CACHE_NODES", "relevance,review").split(",") if n.strip()]
+        llm_cache = LLMCache(
+            max_entries=int(os.getenv("AIQUERY_LLM_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("AIQUERY_LLM_CACHE_TTL", "3600")),
+            path=os.getenv("AIQUERY_LLM_CACHE_FILE") or None
+        ) if cache_nodes else None
+        # Requests admitted at once, matching the server's OLLAMA_NUM_PARALLEL; the
+        # HTTP pool keeps that many keep-alive connections open between calls
+        self.max_parallel = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        import httpx
+        self._limits = httpx.Limits(
+            max_connections=self.max_parallel * 2,
+            max_keepalive_connections=self.max_parallel,
+            keepalive_expiry=float(os.getenv("AIQUERY_KEEPALIVE_EXPIRY", "300"))
+        )
+        # How long Ollama keeps the model loaded after each call, and whether it is
+        # loaded up front (re-warmed every AIQUERY_KEEP_WARM seconds in the GUI)
+        self.keep_alive = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", ""))
+        self.warmup = os.getenv("AIQUERY_WARMUP", "false").lower() in ("1", "true", "yes")
+        self.keep_warm = float(os.getenv("AIQUERY_KEEP_WARM", "0"))
+        # A host failing AIQUERY_HOST_MAX_FAILURES calls in a row is left out for AIQUERY_HOST_EJECT_SECONDS
+        self.host_max_failures = int(os.getenv("AIQUERY_HOST_MAX_FAILURES", "2"))
+        self.host_eject_seconds = float(os.getenv("AIQUERY_HOST_EJECT_SECONDS", "30"))
+        self.client = OllamaClient(
+            self.make_ollama_client(self._limits),
+            cache=llm_cache, cache_nodes=cache_nodes, max_parallel=self.max_parallel * len(self.hosts),
+            keep_alive=self.keep_alive
+        )
+
+        # Web search runs off the event loop with a bounded number of workers
+        self.search_backend = DDGSBackend(
+            max_workers=int(os.getenv("AIQUERY_SEARCH_WORKERS", "4")),
+            timeout=float(os.getenv("AIQUERY_SEARCH_TIMEOUT", "10"))
+        )
+        cache_path = os.getenv("AIQUERY_SEARCH_CACHE", "aiquery_cache.sqlite")
+        if cache_path:
+            self.search_backend = CachedSearchBackend(self.search_backend, SearchCache(
+                cache_path,
+                ttl=float(os.getenv("AIQUERY_SEARCH_CACHE_TTL", "3600")),
+                max_entries=int(os.getenv("AIQUERY_SEARCH_CACHE_SIZE", "5000"))
+            ))
+
+        # Final answers by question, skipping the whole flow on a hit. Near-identical
+        # questions also hit when an embedding model is set
+        answer_cache_size = int(os.getenv("AIQUERY_ANSWER_CACHE_SIZE", "1000"))
+        self.answer_cache = AnswerCache(
+            max_entries=answer_cache_size,
+            similarity=float(os.getenv("AIQUERY_ANSWER_CACHE_SIMILARITY", "0.92"))
+        ) if answer_cache_size > 0 else None
+        self.answer_ttl = float(os.getenv("AIQUERY_ANSWER_CACHE_TTL", "3600"))
+        # Weather and "today" questions go stale quickly
+        self.volatile_answer_ttl = float(os.getenv("AIQUERY_ANSWER_CACHE_VOLATILE_TTL", "600"))
+        self.embed_model = os.getenv("AIQUERY_ANSWER_CACHE_EMBED_MODEL", "")
+        # Identical questions asked while one is being answered share its run
+        coalesce = os.getenv("AIQUERY_COALESCE", "true").lower() in ("1", "true", "yes")
+        self.single_flight = SingleFlight() if coalesce else None
+        # Conversations (GUI and API sessions): earlier turns and their evidence, within byte caps
+        sessions_max_bytes = int(os.getenv("AIQUERY_SESSIONS_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.session_memory = SessionMemory(
+            session_bytes=int(os.getenv("AIQUERY_SESSION_BYTES", str(256 * 1024))),
+            max_bytes=sessions_max_bytes,
+            max_turns=int(os.getenv("AIQUERY_SESSION_TURNS", "5"))
+        ) if sessions_max_bytes > 0 else None
         
         # Get actual system date for the prompt
         self.today = datetime.datetime.now().strftime("%A, %d %B %Y")
@@ -69,56 +603,306 @@ class SearchBotBase:
         Pre-processes snippets to make them more LLM-friendly, 
         especially for cryptic weather formats.
         """
-        # Transform "21.9º" or "25°" into "21.9 graus"
-        text = re.sub(r'(\d+(?:\.\d+)?)[\s]?[°º]', r'\1 graus', text)
-        # Transform "Min: 20 Max: 30" into more explicit text
-        text = re.sub(r'Min:?\s*(\d+)', r'Mínima: \1', text, flags=re.IGNORECASE)
-        text = re.sub(r'Max:?\s*(\d+)', r'Máxima: \1', text, flags=re.IGNORECASE)
-        return text
+        return clean_snippet(text)
 
     def rank_context(self, search_query, context_list):
         """
         Ranks and filters search results based on relevance to the search query.
         """
-        cleaned_list = [self.clean_snippet(snippet) for snippet in context_list]
+        cleaned_list = [clean_snippet(snippet) for snippet in context_list]
         
-        # General ranking based on search query keywords
-        keywords = [word.lower() for word in search_query.split() if len(word) > 2]
-        
-        def rank_score(text):
-            text_lower = text.lower()
-            # Keywords are now much more important
-            score = sum(10 for k in keywords if k in text_lower)
-            
-            # Tiny bonus for weather patterns to break ties if search was about weather
-            if re.search(r'\d+\s*graus', text_lower):
-                score += 1
-            return score
+        # BM25 ranking over accent-insensitive query terms
+        return rank_snippets(search_query, cleaned_list, limit=5)
+
+    async def embed(self, text):
+        """Embedding of `text` with the answer cache's embedding model, or None if unavailable."""
+        if not self.embed_model:
+            return None
+        try:
+            response = await self.client.embed(model=self.embed_model, input=text)
+            return response['embeddings'][0]
+        except Exception as e:
+            logger.warning(f"Embedding with {self.embed_model} failed: {e}")
+            return None
+
+    def model_for(self, node):
+        """Model configured for `node`, falling back to OLLAMA_MODEL."""
+        return self.models.get(node, self.model)
+
+    def make_ollama_client(self, limits=None):
+        """Ollama AsyncClient for the configured host, or a pool of them for several hosts."""
+        make_client = load_ollama()
+        kwargs = {'limits': limits} if limits is not None else {}
+        if len(self.hosts) == 1:
+            return make_client(host=self.host, **kwargs)
+        return OllamaHostPool(
+            {host: make_client(host=host, **kwargs) for host in self.hosts},
+            max_failures=self.host_max_failures, eject_seconds=self.host_eject_seconds
+        )
+
+    async def warm_up(self, client=None):
+        """Loads every configured model ahead of the first question. Failures are logged, never raised."""
+        client = client or self.client
+
+        async def load(model):
+            start = time.perf_counter()
+            try:
+                response = await client.warm_up(model)
+            except Exception as e:
+                logger.warning(f"Warm-up of {model} failed: {e}")
+                return False
+            load = (response.get('load_duration') or 0) / 1e9
+            logger.info(f"Model {model} warm after {time.perf_counter() - start:.2f}s (load {load:.2f}s)")
+            return True
+
+        models = dict.fromkeys(self.models.values())
+        return all(await asyncio.gather(*(load(model) for model in models)))
+
+    def start_keep_warm(self, interval=0):
+        """
+        Warms the model now, then every `interval` seconds if positive, from a
+        daemon thread with its own event loop and Ollama client (the bot's
+        client belongs to the caller's loop). Set the returned Event to stop.
+        """
+        stop = threading.Event()
+        client = OllamaClient(self.make_ollama_client(), keep_alive=self.keep_alive)
+
+        async def keep_warm():
+            while not stop.is_set():
+                await self.warm_up(client)
+                if interval <= 0:
+                    break
+                await asyncio.to_thread(stop.wait, interval)
+
+        threading.Thread(target=asyncio.run, args=(keep_warm(),), name="aiquery-keep-warm", daemon=True).start()
+        return stop
+
+    def context_budgets_for(self, model):
+        """Per-node context budgets for `model`: defaults, then generic settings, then the model's own."""
+        budgets = dict(DEFAULT_CONTEXT_BUDGETS)
+        budgets.update({node: tokens for (m, node), tokens in self.context_budgets.items() if m is None})
+        budgets.update({node: tokens for (m, node), tokens in self.context_budgets.items() if m == model})
+        return budgets
+
+    def metrics(self):
+        """Live gauges for the metrics endpoint: cache effectiveness and Ollama queue."""
+        values = {
+            'aiquery_ollama_in_flight': self.client.in_flight,
+            'aiquery_ollama_waiting': self.client.waiting,
+        }
+        if self.client.cache is not None:
+            stats = self.client.cache.stats()
+            values['aiquery_llm_cache_hits'] = stats['hits']
+            values['aiquery_llm_cache_misses'] = stats['misses']
+        if isinstance(self.search_backend, CachedSearchBackend):
+            stats = self.search_backend.cache.stats()
+            values['aiquery_search_cache_hits'] = stats['hits']
+            values['aiquery_search_cache_misses'] = stats['misses']
+        if self.answer_cache is not None:
+            stats = self.answer_cache.stats()
+            values['aiquery_answer_cache_hits'] = stats['hits']
+            values['aiquery_answer_cache_similar_hits'] = stats['similar_hits']
+            values['aiquery_answer_cache_misses'] = stats['misses']
+        if self.session_memory is not None:
+            stats = self.session_memory.stats()
+            values['aiquery_sessions'] = stats['sessions']
+            values['aiquery_session_memory_bytes'] = stats['bytes']
+            values['aiquery_sessions_evicted'] = stats['evicted_sessions']
+        if self.single_flight is not None:
+            values['aiquery_coalesced_queries'] = self.single_flight.coalesced
+            values['aiquery_queries_in_flight'] = len(self.single_flight)
+        if isinstance(self.client.client, OllamaHostPool):
+            for host, stats in self.client.client.stats().items():
+                for key, value in stats.items():
+                    values[f'aiquery_ollama_host_{key}{{host="{host}"}}'] = value
+        return values
+
+_shared_bot = None
+_shared_bot_lock = threading.Lock()
 
-        return sorted(cleaned_list, key=rank_score, reverse=True)[:5]
+def get_shared_bot():
+    """
+    Process-wide SearchBotBase for long-running entry points (GUI, servers),
+    so every request reuses one Ollama connection pool, admission queue and caches.
+    """
+    global _shared_bot
+    with _shared_bot_lock:
+        if _shared_bot is None:
+            _shared_bot = SearchBotBase()
+        return _shared_bot
 
 # --- Nodes ---
 
+class TokenStream:
+    """
+    Async stream of answer events published by AnswerNode through shared['tokens'].
+    Iterating yields (kind, text) pairs: ('start', '') when an answer attempt
+    begins (a review retry starts over) and ('token', text) for each chunk.
+    Iteration ends once close() is called.
+    """
+    def __init__(self):
+        self._queue = asyncio.Queue()
+
+    def put(self, kind, text=""):
+        self._queue.put_nowait((kind, text))
+
+    def close(self):
+        self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self._queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+# Characters of each earlier answer shown to the LLM with a follow-up question
+CONVERSATION_ANSWER_CHARS = 300
+# Snippets of a run kept in its session for follow-up questions
+SESSION_SNIPPETS = 8
+
+# Seconds the answer prompt takes before the first token, and the shortest answer worth asking for
+ANSWER_PROMPT_SECONDS = 1.0
+MIN_ANSWER_TOKENS = 64
+
+def time_left(shared):
+    """Seconds until the run's deadline, or None without one."""
+    deadline_at = shared.get('deadline_at')
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
 class BaseAsyncNode(AsyncNode):
+    name = "node"
+    skipped = False  # Set when the node gave up its usual work, so its time says nothing
+
     async def prep_async(self, shared):
         return shared
     async def post_async(self, shared, prep_res, exec_res):
         return exec_res
 
+    async def _run_async(self, shared):
+        # Log records of the node carry the run's query id, the node and the
+        # iteration (read when logging, as QueryGenNode advances it)
+        token = LOG_CONTEXT.set({
+            'query_id': shared.get('query_id'), 'node': self.name,
+            'iteration': lambda: shared.get('iteration', 0),
+        })
+        # Every node run becomes a span when the flow is traced
+        trace = shared.get('trace')
+        span = trace.start_span(self.name, shared.get('iteration', 0)) if trace is not None else None
+        start = time.perf_counter()
+        action = None
+        try:
+            action = await super()._run_async(shared)
+            return action
+        finally:
+            duration = time.perf_counter() - start
+            if span is not None:
+                trace.end_span(span, action, shared.get('iteration', 0))
+            latency = shared.get('latency')
+            if action is not None and not self.skipped and isinstance(latency, LatencyModel):
+                latency.observe_node(self.name, duration)
+            logger.info(f"Node {self.name} finished in {duration:.3f}s ({action})", extra={'duration': round(duration, 4)})
+            LOG_CONTEXT.reset(token)
+
+    def model(self, shared):
+        """Model the node runs on: its own OLLAMA_MODEL_<NODE> setting, else the bot's default."""
+        return (shared.get('models') or {}).get(self.name) or shared['bot'].model
+
+    def record_llm(self, shared, model, response):
+        """Adds the Ollama statistics of a (final) response to the flow trace."""
+        if response is None:
+            return
+        trace = shared.get('trace')
+        if trace is not None:
+            trace.record_llm(self.name, model, response)
+        latency = shared.get('latency')
+        if isinstance(latency, LatencyModel):
+            latency.observe_llm(model, response)
+
+    def conversation(self, shared):
+        """Earlier turns of the session, for prompts of follow-up questions ('' without any)."""
+        turns = shared.get('conversation')
+        if not turns:
+            return ""
+        lines = [f"Q: {question}\nA: {answer[:CONVERSATION_ANSWER_CHARS]}" for question, answer in turns]
+        return "CONVERSATION SO FAR (the question may follow up on it):\n" + "\n".join(lines) + "\n"
+
+    def short_of_time(self, shared, *nodes):
+        """True when the deadline leaves less time than `nodes` usually take."""
+        left = time_left(shared)
+        latency = shared.get('latency')
+        if left is None or not isinstance(latency, LatencyModel):
+            return False
+        return left < latency.node_seconds(*nodes)
+
+    def cut(self, shared, what):
+        """Records and reports a step dropped to meet the deadline."""
+        self.skipped = True
+        shared.setdefault('deadline_cuts', []).append(what)
+        left = max(time_left(shared), 0)
+        msg = f"[*] Deadline in {left:.1f}s: {what}"
+        print(msg)
+        logger.info(msg)
+
+    def pack_context(self, shared, snippets):
+        """Whole ranked snippets that fit the node's token budget, one per line."""
+        budget = (shared.get('context_budgets') or {}).get(self.name, DEFAULT_CONTEXT_BUDGETS.get(self.name, 1024))
+        packed, tokens = pack_context(snippets, budget)
+        if packed:
+            logger.info(f"{self.name}: packed {len(packed)}/{len(snippets)} snippets (~{tokens}/{budget} tokens)")
+        return "\n".join(packed)
+
+    def ranked_snippets(self, shared):
+        """Snippets found so far, most relevant to the user question first."""
+        store = shared.get('snippets')
+        if store is not None:
+            return store.ranked()
+        return [line for line in shared.get('context', '').splitlines() if line.strip()]
+
+def parse_queries(text, limit):
+    """Extracts up to `limit` distinct search queries, one per line, from an LLM reply."""
+    queries, seen = [], set()
+    for line in text.splitlines():
+        # Drop list markers ("1.", "2)", "-", "*") and surrounding quotes
+        query = re.sub(r'^\s*(?:\d+[.)]|[-*•])\s*', '', line).strip().strip('"')
+        if query and query.lower() not in seen:
+            seen.add(query.lower())
+            queries.append(query)
+    return queries[:limit]
+
 class QueryGenNode(BaseAsyncNode):
+    name = "querygen"
+
     async def exec_async(self, shared):
         bot = shared['bot']
         it = shared.get('iteration', 0)
         shared['iteration'] = it + 1
+        fanout = shared.get('fanout', 1)
         
         # Include history in query generation to avoid redundancy
-        history_summary = "\n".join(shared.get('history', []))[:1000]
+        store = shared.get('snippets')
+        history_summary = self.pack_context(shared, store.ranked() if store is not None else shared.get('history', []))
         
-        prompt = f"""
+        if fanout > 1:
+            prompt = f"""
+SYSTEM: You are a search assistant. Convert the user's question into {fanout} concise, 
+diverse search queries for DuckDuckGo. If the question compares or lists several 
+things, give each one its own query.
+
+{self.conversation(shared)}USER QUESTION: {shared['user_query']}
+FOUND SO FAR:
+{history_summary if history_summary else "Nothing yet."}
+
+Output ONLY the search queries, one per line.
+SEARCH QUERIES:"""
+        else:
+            prompt = f"""
 SYSTEM: You are a search assistant. Convert the user's question into a concise, 
 effective search query for DuckDuckGo. 
 
-USER QUESTION: {shared['user_query']}
+{self.conversation(shared)}USER QUESTION: {shared['user_query']}
 FOUND SO FAR:
 {history_summary if history_summary else "Nothing yet."}
 
@@ -126,27 +910,43 @@ Output ONLY the search query.
 SEARCH QUERY:"""
         if it > 0: prompt += f"\nPrevious attempt failed. Try different keywords focusing on: {shared.get('feedback', '')}"
         
+        model = self.model(shared)
         msg = f"[*] Formulating query (Attempt {it+1})..."
         print(msg)
-        logger.info(msg)
+        logger.info(f"{msg} [{model}]")
         
         if 'progress' in shared:
             shared['progress'](0.1 + (it * 0.1), desc=f"Formulating query (Attempt {it+1})...")
+
+        if self.short_of_time(shared, 'querygen', 'search', 'answer'):
+            self.cut(shared, "searching for the question as asked")
+            shared['search_query'] = shared['user_query']
+            shared['search_queries'] = [shared['user_query']]
+            return "default"
             
         try:
-            response = await bot.client.generate(model=bot.model, prompt=prompt)
-            query = response.get('response', shared['user_query']).strip().strip('"')
-            shared['search_query'] = query
-            return "default"
+            # A retry needs different queries, not the cached ones of the failed attempt
+            response = await bot.client.generate(model=model, prompt=prompt, node=self.name, cache=it == 0)
+            self.record_llm(shared, model, response)
+            text = response.get('response', shared['user_query'])
+            if fanout > 1:
+                queries = parse_queries(text, fanout) or [shared['user_query']]
+            else:
+                queries = [text.strip().strip('"')]
         except Exception as e:
             print(f"[!] Query Gen Error: {e}")
-            shared['search_query'] = shared['user_query'] # Fallback
-            return "default"
+            queries = [shared['user_query']] # Fallback
+        shared['search_query'] = queries[0]
+        shared['search_queries'] = queries
+        return "default"
 
 class SearchNode(BaseAsyncNode):
+    name = "search"
+
     async def exec_async(self, shared):
         bot = shared['bot']
-        q = shared['search_query']
+        queries = shared.get('search_queries') or [shared['search_query']]
+        q = " | ".join(queries)
         msg = f"[*] Searching for: '{q}'..."
         print(msg)
         logger.info(msg)
@@ -154,34 +954,114 @@ class SearchNode(BaseAsyncNode):
         if 'progress' in shared:
             shared['progress'](0.3 + (shared.get('iteration', 0) * 0.1), desc=f"Searching for: {q}")
             
+        # Fan-out queries run concurrently, capped to avoid hammering the provider
+        limit = asyncio.Semaphore(shared.get('search_concurrency', 3))
+        async def run_search(query):
+            async with limit:
+                return await bot.search_backend.search(query, region='br-pt', max_results=10)
+
+        outcomes = await asyncio.gather(*(run_search(query) for query in queries), return_exceptions=True)
+
         try:
-            with DDGS() as ddgs:
-                results = list(ddgs.text(q, region='br-pt', max_results=10))
+            # Snippets are cleaned, scored and deduplicated once, as they arrive
+            store = shared.get('snippets')
+            if store is None:
+                store = SnippetStore(shared.get('ranking_query') or shared['user_query'], history=shared.get('history'),
+                                     max_distance=shared.get('dedup_distance', 6))
+                shared['snippets'] = store
+                shared['history'] = store.history
 
+            seen_results = set()
+            found = False
+            for query, results in zip(queries, outcomes):
+                if isinstance(results, Exception):
+                    print(f"[!] Search Error: {results}")
+                    continue
                 if not results:
                     # Don't add anything to history if no results
-                    return "default"
-                
-                raw_context = [f"Result: {r.get('title')} - {r.get('body')}" for r in results]
-                new_snippets = bot.rank_context(q, raw_context)
-                
-                # Accumulate history
-                if 'history' not in shared: shared['history'] = []
-                # Simple deduplication based on text overlap (basic)
-                for snip in new_snippets:
-                    if snip not in shared['history']:
-                        shared['history'].append(snip)
-                
+                    continue
+
+                # The same page often comes back from several fan-out queries
+                unique = []
+                for r in results:
+                    key = r.get('href') or (r.get('title'), r.get('body'))
+                    if key not in seen_results:
+                        seen_results.add(key)
+                        unique.append(r)
+                if not unique:
+                    continue
+
+                raw_context = [f"Result: {r.get('title')} - {r.get('body')}" for r in unique]
+                # Accumulate history with the best snippets for this search query
+                store.ingest(raw_context, query)
+                found = True
+            
+            if found:
                 # Update context with everything found so far, ranked by original query
-                shared['context'] = "\n".join(bot.rank_context(shared['user_query'], shared['history']))
+                shared['context'] = "\n".join(store.top())
         except Exception as e:
             print(f"[!] Search Error: {e}")
         return "default"
 
 class RelevanceNode(BaseAsyncNode):
+    name = "relevance"
+
+    def can_retry(self, shared):
+        """Another search attempt fits in the deadline (answering included)."""
+        if self.short_of_time(shared, 'querygen', 'search', 'relevance', 'answer'):
+            self.cut(shared, "answering with the results found so far")
+            return False
+        return True
+
+    def precheck(self, shared, context):
+        """
+        Decides from keyword coverage alone when it is clearly high or clearly
+        low, per shared['relevance_precheck'] = (low, high). Returns the action,
+        or None to leave the decision to the LLM.
+        """
+        thresholds = shared.get('relevance_precheck')
+        if not thresholds:
+            return None
+        low, high = thresholds
+        score, missing = term_coverage(shared['user_query'], context.splitlines())
+        if score is None:
+            return None
+        # Weather questions are covered by snippets with temperature readings
+        missing = ["temperatura" if term == WEATHER_TOKEN else term for term in missing]
+        if score >= high:
+            action = "success"
+        elif score <= low:
+            action = "success" if shared['iteration'] >= 3 or not self.can_retry(shared) else "retry"
+        else:
+            logger.info(f"Relevance precheck: coverage {score:.2f} in ({low}, {high}), asking the LLM")
+            return None
+        msg = f"[*] Relevance decided by keyword coverage {score:.2f}: {action}"
+        print(msg)
+        logger.info(f"{msg} (thresholds {low}/{high}, missing: {', '.join(missing) or 'none'})")
+        if action == "retry":
+            shared['feedback'] = f"Results do not mention: {', '.join(missing)}."
+        return action
+
     async def exec_async(self, shared):
         bot = shared['bot']
-        context = shared.get('context', 'No info found.')
+        context = self.pack_context(shared, self.ranked_snippets(shared))
+        model = self.model(shared)
+        print(f"[*] Checking relevance of accumulated results...")
+        logger.info(f"Checking relevance of accumulated results... [{model}]")
+        if 'progress' in shared:
+            shared['progress'](0.5, desc="Checking relevance of findings...")
+
+        # Clear-cut cases skip the LLM call
+        action = self.precheck(shared, context)
+        if action is not None:
+            self.skipped = True
+            return action
+
+        if self.short_of_time(shared, 'relevance', 'answer'):
+            self.cut(shared, "skipping the relevance check")
+            return "success"
+
+        context = context or 'No info found.'
         prompt = f"""
 SYSTEM: You are a relevance checker. Determine if the provided SEARCH RESULTS adequately answer the USER QUESTION.
 Reply exactly 'YES' if the context is sufficient, or 'NO' if it is not.
@@ -191,17 +1071,15 @@ ACCUMULATED SEARCH RESULTS:
 {context}
 
 ANSWER (YES/NO):"""
-        print(f"[*] Checking relevance of accumulated results...")
-        logger.info("Checking relevance of accumulated results...")
-        if 'progress' in shared:
-            shared['progress'](0.5, desc="Checking relevance of findings...")
-            
         try:
-            response = await bot.client.generate(model=bot.model, prompt=prompt)
+            response = await bot.client.generate(model=model, prompt=prompt, node=self.name)
+            self.record_llm(shared, model, response)
             ans = response.get('response', '').strip().upper()
             
             if "YES" in ans or shared['iteration'] >= 3:
                 return "success"
+            if not self.can_retry(shared):
+                return "success"
             shared['feedback'] = "Need more specific data or missing parts of the question."
             return "retry"
         except Exception as e:
@@ -209,10 +1087,12 @@ ANSWER (YES/NO):"""
             return "success" # Proceed to answer if relevance check fails
 
 class AnswerNode(BaseAsyncNode):
+    name = "answer"
+
     async def exec_async(self, shared):
         bot = shared['bot']
         # Context is already cumulative and ranked by SearchNode
-        safe_context = shared.get('context', '')[:5000]
+        safe_context = self.pack_context(shared, self.ranked_snippets(shared))
 
         prompt = f"""
 SYSTEM: Today is {bot.today}. Using the SEARCH RESULTS provided, answer the user's question accurately.
@@ -221,39 +1101,99 @@ If you don't know the answer, say so based on the results.
 SEARCH RESULTS:
 {safe_context}
 
-USER QUESTION: {shared['user_query']}
+{self.conversation(shared)}USER QUESTION: {shared['user_query']}
 ANSWER (in the same language):"""
 
+        # Answer tokens go to the console and, when a TokenStream is given, to
+        # shared['tokens']. A speculative answer holds all of it back until the
+        # flow commits to it (see SpeculativeFlow)
+        gate = shared.get('speculation_gate')
+        tokens = shared.get('tokens')
+        pending = []
+        def write(kind, text, end):
+            if text:
+                print(text, end=end, flush=True)
+            if tokens is not None and kind != 'message':
+                tokens.put(kind, text)
+        def emit(text, end="\n", kind='message'):
+            if gate is not None and not gate.is_set():
+                pending.append((kind, text, end))
+                return
+            for held in pending:
+                write(*held)
+            pending.clear()
+            write(kind, text, end)
+
+        model = self.model(shared)
         msg = f"[*] Generating answer (Streaming)..."
-        print(msg)
-        logger.info(msg)
+        emit(msg)
+        emit("", kind='start')
+        logger.info(f"{msg if gate is None else 'Generating answer speculatively...'} [{model}]")
         
-        if 'progress' in shared:
+        if 'progress' in shared and gate is None:
             shared['progress'](0.8, desc="Generating final answer...")
+
+        # With a deadline, the answer is only as long as the model can write in the time left
+        kwargs = {}
+        left = time_left(shared)
+        latency = shared.get('latency')
+        if left is not None and isinstance(latency, LatencyModel):
+            writing = max(left - ANSWER_PROMPT_SECONDS, 0)
+            kwargs['options'] = {'num_predict': max(int(writing * latency.tokens_per_sec(model)), MIN_ANSWER_TOKENS)}
+            logger.info(f"Answer limited to {kwargs['options']['num_predict']} tokens ({left:.1f}s left)")
             
+        chunks = []
+        # What is written so far, should the deadline cut the answer short
+        shared['answer_draft'] = chunks
         try:
             response = await bot.client.generate(
-                model=bot.model,
+                model=model,
                 prompt=prompt,
-                stream=True
+                stream=True,
+                node=self.name,
+                **kwargs
             )
 
-            full_response = ""
-            async for chunk in response:
-                content = chunk.get('response', '')
-                print(content, end='', flush=True)
-                full_response += content
+            last = None
+            try:
+                async for chunk in response:
+                    content = chunk.get('response', '')
+                    emit(content, end='', kind='token')
+                    chunks.append(content)
+                    last = chunk
+                # The final chunk carries the timing statistics
+                self.record_llm(shared, model, last)
+            finally:
+                # Closing the stream matters when a speculative answer is cancelled
+                if hasattr(response, 'aclose'):
+                    await response.aclose()
             
-            print("\n" + "-"*30)
-            shared['answer'] = full_response
+            if gate is not None:
+                await gate.wait()
+            emit("\n" + "-"*30)
+            shared['answer'] = "".join(chunks)
+            shared.pop('answer_draft', None)
+            if last is not None and last.get('done_reason') == 'length' and 'options' in kwargs:
+                shared.setdefault('deadline_cuts', []).append("answer shortened")
             return "default"
 
+        except asyncio.CancelledError:
+            # A discarded speculative answer was rejected by the flow: it is no draft to fall back on
+            if gate is not None and not gate.is_set() and shared.get('answer_draft') is chunks:
+                del shared['answer_draft']
+            raise
         except Exception as e:
-            print(f"\n[!] Answer Generation Error: {e}")
+            if gate is not None:
+                await gate.wait()
+            emit(f"\n[!] Answer Generation Error: {e}")
+            shared.pop('answer_draft', None)
             shared['answer'] = f"Could not generate an answer due to an error: {e}"
+            shared['answer_failed'] = True
             return "default"
 
 class ReviewNode(BaseAsyncNode):
+    name = "review"
+
     async def exec_async(self, shared):
         bot = shared['bot']
         prompt = f"""
@@ -271,15 +1211,22 @@ GENERATED ANSWER: {shared['answer']}
 
 Output ONLY the integer score (1-10).
 SCORE:"""
+        model = self.model(shared)
         msg = "[*] Reviewing generated answer..."
         print(msg)
-        logger.info(msg)
+        logger.info(f"{msg} [{model}]")
         
         if 'progress' in shared:
             shared['progress'](0.9, desc="Critiquing answer quality...")
+
+        # A failed review only helps if another attempt still fits in the deadline
+        if self.short_of_time(shared, 'review', 'querygen', 'search', 'relevance', 'answer'):
+            self.cut(shared, "skipping the answer review")
+            return "pass"
             
         try:
-            response = await bot.client.generate(model=bot.model, prompt=prompt)
+            response = await bot.client.generate(model=model, prompt=prompt, node=self.name)
+            self.record_llm(shared, model, response)
             match = re.search(r'\d+', response.get('response', '0'))
             score = int(match.group()) if match else 0
             log_score = f"[*] Answer scored: {score}/10"
@@ -296,6 +1243,286 @@ SCORE:"""
 
 # --- Flow ---
 
+class SpeculativeFlow(AsyncFlow):
+    """
+    AsyncFlow that can start a successor before its predecessor decides.
+    For a node registered with speculate(node, action), when shared['speculative']
+    is set the successor for `action` runs concurrently with the node. It is
+    kept if the node returns `action` and cancelled otherwise.
+    """
+    def speculate(self, node, action="default"):
+        node.speculate_on = action
+        return node
+
+    async def _orch_async(self, shared, params=None):
+        curr, p, last_action = copy.copy(self.start_node), (params or {**self.params}), None
+        while curr:
+            curr.set_params(p)
+            action = getattr(curr, 'speculate_on', None)
+            if action in curr.successors and shared.get('speculative'):
+                last_action, curr = await self._run_speculative(curr, action, shared, p)
+                continue
+            last_action = await curr._run_async(shared) if isinstance(curr, AsyncNode) else curr._run(shared)
+            curr = copy.copy(self.get_next_node(curr, last_action))
+        return last_action
+
+    async def _run_speculative(self, node, action, shared, params):
+        ahead = copy.copy(node.successors[action])
+        ahead.set_params(params)
+        gate = asyncio.Event()
+        shared['speculation_gate'] = gate
+        task = asyncio.create_task(ahead._run_async(shared))
+        try:
+            last_action = await node._run_async(shared)
+            if last_action == action:
+                logger.info(f"Speculation on '{action}' confirmed")
+                gate.set()
+                ahead_action = await task
+                return ahead_action, copy.copy(self.get_next_node(ahead, ahead_action))
+            logger.info(f"Speculation on '{action}' discarded ('{last_action}')")
+            return last_action, copy.copy(self.get_next_node(node, last_action))
+        finally:
+            shared.pop('speculation_gate', None)
+            # No-op once the task was awaited; otherwise this cancels and reaps it
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+
+def new_shared(bot, user_query, **extra):
+    """
+    Initial shared state for a flow run, with run options defaulting to the
+    bot's settings. Later log records of the calling task carry its query id.
+    """
+    shared = {
+        'bot': bot,
+        'user_query': user_query,
+        'iteration': 0,
+        'history': [],
+        'fanout': bot.fanout,
+        'search_concurrency': bot.search_concurrency,
+        'dedup_distance': bot.dedup_distance,
+        'speculative': bot.speculative,
+        'models': dict(bot.models),
+        'context_budgets': {
+            node: bot.context_budgets_for(bot.model_for(node))[node] for node in DEFAULT_CONTEXT_BUDGETS
+        },
+        'relevance_precheck': bot.relevance_precheck,
+        'answer_cache': bot.answer_cache,
+        'single_flight': bot.single_flight,
+        'deadline': bot.deadline,
+        'latency': bot.latency,
+        'session_memory': bot.session_memory,
+    }
+    shared.update(extra)
+    # A follow-up question starts from the session's earlier turns and evidence
+    memory = shared['session_memory']
+    if shared.get('session') and isinstance(memory, SessionMemory):
+        turns, snippets = memory.recall(shared['session'])
+        if turns:
+            shared['conversation'] = turns
+            shared['history'] = snippets
+            shared['ranking_query'] = f"{turns[-1][0]} {user_query}"
+    # The deadline counts from here; nodes plan with time_left(shared)
+    if isinstance(shared['deadline'], (int, float)) and shared['deadline'] > 0:
+        shared['deadline_at'] = time.monotonic() + shared['deadline']
+    shared.setdefault('query_id', shared['trace'].id if shared.get('trace') else uuid.uuid4().hex[:12])
+    LOG_CONTEXT.set({'query_id': shared['query_id']})
+    return shared
+
+class _Flight:
+    """One in-flight run shared by every waiter of the same question."""
+    def __init__(self):
+        self.task = None
+        self.shared = None
+        self.events = []  # Replayed to waiters that join late
+        self.listeners = []
+        self.waiters = 0
+
+    def publish(self, event):
+        self.events.append(event)
+        for listener in list(self.listeners):
+            listener(event)
+
+    def put(self, kind, text=""):
+        # Installed as shared['tokens'] of the shared run
+        self.publish(('token', kind, text))
+
+    def progress(self, value, desc=""):
+        self.publish(('progress', value, desc))
+
+class SingleFlight:
+    """
+    Coalesces concurrent runs of the same question: the first request starts
+    the flow, identical requests arriving while it runs attach to it and get
+    its answer, progress and token stream (replayed from the start). The run
+    belongs to no single waiter: it goes on while anyone waits for it and is
+    cancelled when the last one is.
+    """
+    # Keys of a waiter's shared dict that belong to the waiter, not to the run
+    OWN_KEYS = ('tokens', 'progress', 'trace', 'query_id', 'session')
+
+    def __init__(self):
+        self.started = 0
+        self.coalesced = 0
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    @staticmethod
+    def key(shared):
+        """Questions equal up to case, accents and punctuation, with the same run options."""
+        models = tuple(sorted(shared.get('models', {}).items()))
+        # A follow-up only means the same within its own conversation
+        session = shared.get('session') if shared.get('conversation') else None
+        return (normalize_question(shared['user_query']), shared.get('fanout'), shared.get('speculative'),
+                shared.get('deadline'), session, models)
+
+    async def run(self, shared, runner):
+        """Runs `runner` on a copy of `shared`, or waits for the identical run in flight, and copies its results back."""
+        key = self.key(shared)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.shared = dict(shared, tokens=flight, progress=flight.progress)
+            flight.task = asyncio.create_task(runner(flight.shared))
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            self._flights[key] = flight
+            self.started += 1
+        else:
+            self.coalesced += 1
+            shared['coalesced'] = True
+            msg = "[*] Same question already in flight, joining it."
+            print(msg)
+            logger.info(f"{msg} ({shared['user_query']!r})")
+
+        listener = self._listener(shared)
+        for event in flight.events:
+            listener(event)
+        flight.listeners.append(listener)
+        flight.waiters += 1
+        try:
+            action = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # The last waiter left (e.g. the client disconnected): nobody needs the run anymore
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                self._finish(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+            flight.listeners.remove(listener)
+        shared.update({k: v for k, v in flight.shared.items() if k not in self.OWN_KEYS})
+        return action
+
+    def _finish(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @staticmethod
+    def _listener(shared):
+        tokens = shared.get('tokens')
+        progress = shared.get('progress')
+        def listener(event):
+            if event[0] == 'token':
+                if tokens is not None:
+                    tokens.put(event[1], event[2])
+            elif progress is not None:
+                progress(event[1], desc=event[2])
+        return listener
+
+async def run_flow(shared):
+    """
+    Answers shared['user_query']. Identical questions already being answered
+    are joined instead of run again (see SingleFlight).
+    """
+    flights = shared.get('single_flight')
+    if isinstance(flights, SingleFlight):
+        action = await flights.run(shared, answer_question)
+    else:
+        action = await answer_question(shared)
+    remember_turn(shared)
+    return action
+
+def remember_turn(shared):
+    """Keeps the question, its answer and best snippets in the session, for follow-ups."""
+    memory = shared.get('session_memory')
+    if not shared.get('session') or not isinstance(memory, SessionMemory):
+        return
+    if not shared.get('answer') or shared.get('answer_failed'):
+        return
+    store = shared.get('snippets')
+    snippets = store.ranked()[:SESSION_SNIPPETS] if store is not None else []
+    memory.remember(shared['session'], shared['user_query'], shared['answer'], snippets)
+
+async def answer_question(shared):
+    """
+    Answers shared['user_query'] from the answer cache when possible, skipping
+    the flow entirely; otherwise runs build_flow() and caches its answer.
+    """
+    cache = shared.get('answer_cache')
+    # Follow-ups ("and tomorrow?") mean something else in every conversation
+    if not isinstance(cache, AnswerCache) or shared.get('conversation'):
+        return await run_until_deadline(shared)
+
+    bot = shared['bot']
+    question = shared['user_query']
+    # Repeated questions are found without asking Ollama for an embedding
+    vector = None
+    answer = cache.get_exact(question)
+    if answer is None:
+        vector = await bot.embed(question)
+        answer = cache.get(question, vector)
+    if answer is not None:
+        msg = "[*] Answer found in cache."
+        print(msg)
+        logger.info(f"{msg} ({question!r})")
+        shared['answer'] = answer
+        shared['cached_answer'] = True
+        tokens = shared.get('tokens')
+        if tokens is not None:
+            tokens.put('start')
+            tokens.put('token', answer)
+        return "cached"
+
+    action = await run_until_deadline(shared)
+    # Answers cut short by a deadline are not worth keeping
+    if shared.get('answer') and not shared.get('answer_failed') and not shared.get('deadline_cuts'):
+        ttl = bot.volatile_answer_ttl if is_time_sensitive(question) else bot.answer_ttl
+        cache.put(question, shared['answer'], ttl, vector)
+    return action
+
+async def run_until_deadline(shared):
+    """
+    Runs build_flow(), stopping it at the deadline with the best answer so
+    far: the last complete answer, else the part written of the current
+    one, else the most relevant results found.
+    """
+    left = time_left(shared)
+    if left is None:
+        return await build_flow().run_async(shared)
+    try:
+        return await asyncio.wait_for(build_flow().run_async(shared), timeout=max(left, 0))
+    except asyncio.TimeoutError:
+        shared.setdefault('deadline_cuts', []).append("stopped at the deadline")
+        draft = "".join(shared.pop('answer_draft', None) or []).strip()
+        if shared.get('answer'):
+            source = "the last complete answer"
+        elif draft:
+            shared['answer'] = draft
+            source = "the answer written so far"
+        else:
+            store = shared.get('snippets')
+            found = store.top() if store is not None else []
+            shared['answer'] = "No answer could be written before the deadline." + (
+                " Most relevant results found:\n" + "\n".join(f"- {line}" for line in found) if found else "")
+            shared['answer_failed'] = True
+            source = "the results found"
+        msg = f"[!] Deadline of {shared['deadline']:g}s reached, returning {source}."
+        print(msg)
+        logger.warning(msg)
+        return "deadline"
+
 def build_flow():
     qgen = QueryGenNode()
     search = SearchNode()
@@ -309,9 +1536,135 @@ def build_flow():
     ans >> rev
     rev - "fail" >> qgen # If answer review fails, retry query generation
     
-    flow = AsyncFlow(start=qgen)
+    flow = SpeculativeFlow(start=qgen)
+    # With shared['speculative'], the answer starts while relevance is being checked
+    flow.speculate(rel, "success")
     return flow
 
+# --- Batch ---
+
+def read_batch(lines):
+    """
+    Parses batch input: one question per line, or JSON lines with a "query"
+    and an optional "id". Blank lines are skipped.
+    """
+    items = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"line {number}: invalid JSON ({e})") from None
+            if not isinstance(item, dict):
+                raise ValueError(f"line {number}: expected a JSON object")
+            if not str(item.get('query', '')).strip():
+                raise ValueError(f"line {number}: missing 'query'")
+        else:
+            item = {'query': line}
+        item.setdefault('id', len(items))
+        items.append(item)
+    return items
+
+async def run_batch(bot, items, output, concurrency=4, ordered=True, trace_file=None, **options):
+    """
+    Runs one flow per item with at most `concurrency` in flight, all sharing
+    `bot`, and writes one JSON line per result to `output`. With `ordered`,
+    results are written in input order as soon as their predecessors are done.
+    With `trace_file`, every run's trace is appended to it as JSON lines.
+    """
+    limit = asyncio.Semaphore(concurrency)
+    finished = {}
+    next_index = 0
+
+    async def run_one(index, item):
+        nonlocal next_index
+        async with limit:
+            trace = Trace(item['query']) if trace_file else None
+            shared = new_shared(bot, item['query'], trace=trace, **options)
+            logger.info(f"Starting batch query {item['id']}: '{item['query']}'")
+            start_perf = time.perf_counter()
+            error = None
+            try:
+                await run_flow(shared)
+            except Exception as e:
+                logger.error(f"Flow execution failed for batch query {item['id']}: {e}")
+                error = str(e)
+            result = {
+                'id': item['id'],
+                'query': item['query'],
+                'answer': shared.get('answer'),
+                'iterations': shared.get('iteration', 0),
+                'elapsed': round(time.perf_counter() - start_perf, 3),
+            }
+            if error:
+                result['error'] = error
+            if shared.get('deadline_cuts'):
+                result['deadline_cuts'] = shared['deadline_cuts']
+            if trace_file:
+                shared['trace'].write_jsonl(trace_file)
+
+        if not ordered:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            return
+        finished[index] = result
+        while next_index in finished:
+            output.write(json.dumps(finished.pop(next_index), ensure_ascii=False) + "\n")
+            next_index += 1
+        output.flush()
+
+    await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+
+def describe_models(models):
+    """Models of a run grouped by model, e.g. "llama3.2:1B (querygen, relevance, review), qwen2.5:7b (answer)"."""
+    nodes = {}
+    for node, model in models.items():
+        nodes.setdefault(model, []).append(node)
+    return ", ".join(f"{model} ({', '.join(names)})" for model, names in nodes.items())
+
+def start_warm_up(bot, enabled=None):
+    """Starts loading the model in the background when enabled (None defers to the bot's setting)."""
+    if enabled is None:
+        enabled = bot.warmup
+    if not enabled:
+        return None
+    msg = f"[*] Warming up {', '.join(dict.fromkeys(bot.models.values()))}..."
+    print(msg)
+    logger.info(msg)
+    return asyncio.create_task(bot.warm_up())
+
+async def finish_warm_up(task):
+    """Reaps a warm-up task; one still loading when there is nothing left to do is cancelled."""
+    if task is None:
+        return
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+async def read_input(prompt):
+    """
+    input() that keeps the event loop running (e.g. a model warm-up) while
+    the user types. A daemon thread is used so Ctrl-C does not wait for it.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            loop.call_soon_threadsafe(settle, future.set_result, input(prompt))
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
 async def main():
     parser = argparse.ArgumentParser(
         description="AiQuery - Autonomous Search Agent\n\n"
@@ -321,13 +1674,32 @@ async def main():
         epilog="Examples:\n"
                "  ./aiquery.py \"Qual a capital da França?\"\n"
                "  ./aiquery.py --gui\n"
-               "  ./aiquery.py -t \"Como está o clima em SP?\""
+               "  ./aiquery.py -t \"Como está o clima em SP?\"\n"
+               "  ./aiquery.py --batch perguntas.txt -c 8 -o respostas.jsonl"
     )
     parser.add_argument("query", nargs="?", help="Direct search query (skips interactive prompt)")
     parser.add_argument("-t", "--timestamp", action="store_true", help="Report execution timestamps and duration")
+    parser.add_argument("-f", "--fanout", type=int, metavar="N", help="Generate N search queries per attempt and run them concurrently")
+    parser.add_argument("-s", "--speculative", action="store_true", help="Start generating the answer while relevance is checked")
+    parser.add_argument("-d", "--deadline", type=parse_deadline, metavar="SECONDS",
+                        help="Answer within SECONDS, skipping optional steps as time runs out (default: AIQUERY_DEADLINE)")
+    parser.add_argument("--trace", action="store_true", help="Print per-node spans and LLM call statistics")
+    parser.add_argument("--trace-file", metavar="FILE", help="Append the run trace to FILE as JSON lines")
+    parser.add_argument("-w", "--warmup", action=argparse.BooleanOptionalAction, default=None,
+                        help="Load the model while the question is read (default: AIQUERY_WARMUP)")
     parser.add_argument("-g", "--gui", action="store_true", help="Launch the Web GUI (Gradio)")
+    parser.add_argument("--serve", nargs="?", const="127.0.0.1:8080", metavar="[HOST:]PORT",
+                        help="Serve the HTTP API (POST /query, SSE on /stream) on HOST:PORT (default: 127.0.0.1:8080)")
+    parser.add_argument("-b", "--batch", metavar="FILE", help="Answer every question in FILE ('-' for stdin), one per line or JSONL")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, metavar="N", help="Questions answered concurrently in batch or serve mode (default: 4)")
+    parser.add_argument("-o", "--output", metavar="FILE", help="Write batch results (JSONL) to FILE instead of stdout")
+    parser.add_argument("--unordered", action="store_true", help="Write batch results as they finish instead of in input order")
+    parser.add_argument("--log-file", metavar="FILE", help="Log file, rotated by size or schedule (default: AIQUERY_LOG_FILE or aiquery.log)")
+    parser.add_argument("--log-level", metavar="LEVEL", help="Logging level, e.g. DEBUG or WARNING (default: AIQUERY_LOG_LEVEL or INFO)")
+    parser.add_argument("--log-format", choices=("text", "json"), help="Log as text or JSON lines with query id, node, iteration and duration")
     parser.add_argument("-V", "--version", action="version", version="AiQuery 1.0.0", help="Show current version")
     args = parser.parse_args()
+    init_runtime(path=args.log_file, level=args.log_level, fmt=args.log_format)
 
     if args.gui:
         msg = "[*] Launching AiQuery Web GUI..."
@@ -337,26 +1709,77 @@ async def main():
         launch_gui()
         return
 
+    if args.serve:
+        from server import serve, parse_address
+        host, port = parse_address(args.serve)
+        await serve(host, port, concurrency=args.concurrency)
+        return
+
+    # Per-run overrides of the bot's defaults
+    options = {}
+    if args.fanout:
+        options['fanout'] = args.fanout
+    if args.speculative:
+        options['speculative'] = True
+    if args.deadline is not None:
+        options['deadline'] = args.deadline
+
+    if args.batch:
+        try:
+            source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+            with source:
+                items = read_batch(source)
+        except (OSError, ValueError) as e:
+            sys.exit(f"[!] Cannot read batch {args.batch}: {e}")
+        bot = SearchBotBase()
+        warm = start_warm_up(bot, args.warmup)
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        start_perf = time.perf_counter()
+        try:
+            # Node progress messages go to stderr, keeping stdout for the JSONL results
+            with contextlib.redirect_stdout(sys.stderr):
+                await run_batch(bot, items, output, concurrency=args.concurrency,
+                                ordered=not args.unordered, trace_file=args.trace_file, **options)
+        finally:
+            if args.output:
+                output.close()
+            await finish_warm_up(warm)
+        duration = time.perf_counter() - start_perf
+        logger.info(f"Batch of {len(items)} queries finished in {duration:.2f}s")
+        if args.timestamp:
+            print(f"[*] {len(items)} queries in {duration:.2f} seconds", file=sys.stderr)
+        return
+
     bot = SearchBotBase()
-    user_query = args.query if args.query else input("Enter your question: ")
+    # The model loads while the question is typed
+    warm = start_warm_up(bot, args.warmup)
+    if args.query:
+        user_query = args.query
+    elif warm is not None:
+        user_query = await read_input("Enter your question: ")
+    else:
+        user_query = input("Enter your question: ")
     
     if not user_query.strip():
         print("[!] No query provided. Exiting.")
+        await finish_warm_up(warm)
         return
 
+    if args.trace or args.trace_file:
+        options['trace'] = Trace(user_query)
+    shared = new_shared(bot, user_query, **options)
     logger.info(f"Starting query: '{user_query}'")
-    shared = {'bot': bot, 'user_query': user_query, 'iteration': 0, 'history': []}
     
     start_time_stamp = datetime.datetime.now()
     start_perf = time.perf_counter()
 
     try:
-        flow = build_flow()
-        await flow.run_async(shared)
+        await run_flow(shared)
     except Exception as e:
         logger.error(f"Flow execution failed: {e}")
         print(f"[!] Critical Error: {e}")
     finally:
+        await finish_warm_up(warm)
         end_time_stamp = datetime.datetime.now()
         end_perf = time.perf_counter()
         duration = end_perf - start_perf
@@ -371,10 +1794,18 @@ async def main():
                 f"Initial Timestamp: {start_time_stamp.strftime('%Y-%m-%d %H:%M:%S')}\n"
                 f"Final Timestamp:   {end_time_stamp.strftime('%Y-%m-%d %H:%M:%S')}\n"
                 f"Elapsed Time:      {duration:.2f} seconds\n"
+                f"Models:            {describe_models(shared.get('models', {}))}\n"
                 f"{'='*30}"
             )
             print(timing_info)
             logger.info(f"Execution time: {duration:.2f}s")
 
+        if args.trace:
+            print("\n" + shared['trace'].report())
+        if args.trace_file:
+            shared['trace'].write_jsonl(args.trace_file)
+
 if __name__ == "__main__":
+    # app.py and server.py import this module by name; let them share this instance
+    sys.modules.setdefault("aiquery", sys.modules[__name__])
     asyncio.run(main())
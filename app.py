@@ -24,35 +24,57 @@
 
 import gradio as gr
 import asyncio
-from aiquery import SearchBotBase, build_flow
+import os
+from aiquery import get_shared_bot, TokenStream, run_flow, new_shared, init_runtime
+from telemetry import Trace, METRICS, start_metrics_server
 
-async def run_agent(question, progress=gr.Progress()):
+async def run_agent(question, progress=gr.Progress(), tokens=None, **options):
     """Bridge between Gradio and the AiQuery Agent."""
     progress(0, desc="Initializing AiQuery...")
-    bot = SearchBotBase()
+    # One bot for the whole process: pooled connections and a shared Ollama admission queue
+    bot = get_shared_bot()
     
-    # Initialize shared state
-    shared = {
-        'bot': bot, 
-        'user_query': question, 
-        'iteration': 0, 
-        'history': [],
-        'progress': progress  # Pass progress object for real-time updates
-    }
+    # Initialize shared state, passing the progress object for real-time updates
+    shared = new_shared(bot, question, progress=progress, trace=Trace(question), **options)
+    if tokens is not None:
+        shared['tokens'] = tokens
     
-    flow = build_flow()
-    
-    # Run the flow - internal nodes will update the progress bar
-    await flow.run_async(shared)
+    # Run the flow - internal nodes will update the progress bar. Repeated
+    # questions are answered from the answer cache without running it
+    try:
+        await run_flow(shared)
+    finally:
+        METRICS.observe(shared['trace'])
     
     progress(1.0, desc="Finalizing answer...")
     return shared.get('answer', "No answer generated.")
 
-async def chat_interface(question):
-    """Async handler for the AiQuery agent."""
+async def chat_interface(question, deadline=None, request: gr.Request = None, progress=gr.Progress()):
+    """Async handler for the AiQuery agent, streaming the answer as it is generated."""
     if not question.strip():
-        return "Please enter a question."
-    return await run_agent(question)
+        yield "Please enter a question."
+        return
+
+    # A deadline of 0 means no limit; None keeps the default (AIQUERY_DEADLINE)
+    options = {} if deadline is None else {'deadline': deadline or None}
+    # Each browser session is a conversation: follow-up questions reuse its earlier evidence
+    if request is not None:
+        options['session'] = request.session_hash
+    tokens = TokenStream()
+    task = asyncio.create_task(run_agent(question, progress, tokens, **options))
+    task.add_done_callback(lambda _: tokens.close())
+    try:
+        chunks = []
+        async for kind, text in tokens:
+            if kind == 'start':
+                chunks = []  # A new answer attempt replaces the previous one
+                continue
+            chunks.append(text)
+            yield "".join(chunks)
+        yield await task
+    finally:
+        # The client went away: stop the flow instead of finishing it for nobody
+        task.cancel()
 
 # Create the Gradio interface
 with gr.Blocks() as demo:
@@ -66,6 +88,11 @@ with gr.Blocks() as demo:
                 placeholder="Ex: Who won the Best Picture Oscar in 2024?", 
                 label="Your Question"
             )
+            deadline_input = gr.Number(
+                value=0,
+                minimum=0,
+                label="Deadline (seconds, 0 = no limit)"
+            )
             submit_btn = gr.Button("Submit", variant="primary")
             
         with gr.Column():
@@ -82,13 +109,25 @@ with gr.Blocks() as demo:
 
     submit_btn.click(
         fn=chat_interface,
-        inputs=input_text,
+        inputs=[input_text, deadline_input],
         outputs=output_md,
         show_progress="full"
     )
+    # The deadline field starts at the configured default
+    demo.load(fn=lambda: get_shared_bot().deadline or 0, outputs=deadline_input)
 
 def launch_gui():
     """Launches the AiQuery Gradio interface."""
+    init_runtime()
+    bot = get_shared_bot()
+    # Load the model before the first question and keep it loaded while idle
+    if bot.warmup or bot.keep_warm > 0:
+        bot.start_keep_warm(bot.keep_warm)
+    # Optional Prometheus endpoint with per-node latency, token and cache metrics
+    metrics_port = os.getenv("AIQUERY_METRICS_PORT")
+    if metrics_port:
+        METRICS.sources.append(bot.metrics)
+        start_metrics_server(int(metrics_port))
     demo.launch(theme="soft")
     # demo.launch(theme="soft", app_title="AiQuery")
 
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2026 Rogerio O. Ferraz
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import io
+import json
+import math
+import time
+import asyncio
+import argparse
+import contextlib
+from caching import normalize_query
+from aiquery import SearchBotBase, SearchBackend, build_flow, new_shared
+
+RECORDED_SEARCHES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_searches.json")
+
+DEFAULT_QUESTIONS = [
+    "Qual a capital da França?",
+    "Quem ganhou o Oscar de Melhor Filme em 2024?",
+    "Compare o clima de Londres e Paris hoje.",
+    "Como está o clima em SP?",
+]
+
+class FakeOllamaServer:
+    """
+    Minimal stand-in for the Ollama HTTP API (POST /api/generate), streaming
+    or not. Replies depend on the prompt (query, YES/NO, score or answer) and
+    are paced by `latency` (prompt evaluation) and `tokens_per_sec`.
+    """
+    def __init__(self, latency=0.05, tokens_per_sec=200.0, answer_tokens=40, relevance_reply="YES", review_reply="8"):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.relevance_reply = relevance_reply
+        self.review_reply = review_reply
+        self.calls = 0
+        self.calls_by_kind = {}
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def reply_for(self, prompt):
+        if "relevance checker" in prompt:
+            return "relevance", self.relevance_reply.split()
+        if "quality assurance" in prompt:
+            return "review", self.review_reply.split()
+        if "search assistant" in prompt:
+            if "one per line" in prompt:
+                return "querygen", ["clima Londres hoje\n", "clima Paris hoje"]
+            return "querygen", ["resultado", "da", "pesquisa"]
+        return "answer", [f"palavra{i} " for i in range(self.answer_tokens)]
+
+    async def _handle(self, reader, writer):
+        try:
+            # Connections are kept alive, like the real server
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if method == "POST" and path == "/api/generate":
+                    await self._generate(json.loads(body or b"{}"), writer)
+                else:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _generate(self, request, writer):
+        kind, tokens = self.reply_for(request.get("prompt", ""))
+        self.calls += 1
+        self.calls_by_kind[kind] = self.calls_by_kind.get(kind, 0) + 1
+        # Like Ollama, stop after options.num_predict tokens
+        limit = (request.get("options") or {}).get("num_predict")
+        truncated = limit is not None and 0 <= limit < len(tokens)
+        if truncated:
+            tokens = tokens[:limit]
+        stats = {
+            "model": request.get("model"), "done": True, "done_reason": "length" if truncated else "stop",
+            "prompt_eval_count": len(request.get("prompt", "")) // 4,
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": len(tokens), "eval_duration": int(len(tokens) / self.tokens_per_sec * 1e9),
+            "load_duration": 0,
+        }
+        await asyncio.sleep(self.latency)
+
+        if not request.get("stream", True):
+            await asyncio.sleep(len(tokens) / self.tokens_per_sec)
+            payload = json.dumps({**stats, "response": "".join(tokens)}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_sec)
+            self._write_chunk(writer, {"model": request.get("model"), "response": token, "done": False})
+            await writer.drain()
+        self._write_chunk(writer, {**stats, "response": ""})
+        writer.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _write_chunk(writer, data):
+        line = json.dumps(data).encode() + b"\n"
+        writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+
+class RecordedSearchBackend(SearchBackend):
+    """Replays recorded result sets by normalized query, with a fixed latency and a default set."""
+    def __init__(self, path=RECORDED_SEARCHES, latency=0.02):
+        with open(path, encoding="utf-8") as f:
+            recorded = json.load(f)
+        self.default = recorded.pop("*", [])
+        self.results = {normalize_query(query): results for query, results in recorded.items()}
+        self.latency = latency
+        self.calls = 0
+
+    async def search(self, query, region='br-pt', max_results=10):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.results.get(normalize_query(query), self.default)[:max_results]
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+async def run_level(server, questions, requests, concurrency, search_latency=0.02, max_parallel=4, **options):
+    """Runs `requests` flows with `concurrency` in flight against the stand-ins and returns a report row."""
+    # The bot is configured as in production, but without caches so every run does the full amount of work
+    settings = {
+        "OLLAMA_HOST": server.url, "OLLAMA_NUM_PARALLEL": str(max_parallel),
+        "AIQUERY_LLM_CACHE_NODES": "", "AIQUERY_SEARCH_CACHE": "",
+    }
+    saved = {key: os.environ.get(key) for key in settings}
+    os.environ.update(settings)
+    try:
+        bot = SearchBotBase()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    bot.search_backend = RecordedSearchBackend(latency=search_latency)
+
+    calls_before = server.calls
+    limit = asyncio.Semaphore(concurrency)
+    latencies, iterations = [], []
+
+    async def one(question):
+        async with limit:
+            shared = new_shared(bot, question, **options)
+            start = time.perf_counter()
+            await build_flow().run_async(shared)
+            latencies.append(time.perf_counter() - start)
+            iterations.append(shared.get('iteration', 0))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one(questions[i % len(questions)]) for i in range(requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'throughput': requests / wall,
+        'llm_calls': server.calls - calls_before,
+        'searches': bot.search_backend.calls,
+        'iterations': sum(iterations) / len(iterations),
+    }
+
+async def run_benchmark(levels=(1, 4, 16), requests=32, questions=DEFAULT_QUESTIONS, latency=0.05,
+                        tokens_per_sec=200.0, search_latency=0.02, max_parallel=4, **options):
+    server = await FakeOllamaServer(latency=latency, tokens_per_sec=tokens_per_sec).start()
+    try:
+        return [
+            await run_level(server, questions, requests, level, search_latency, max_parallel, **options)
+            for level in levels
+        ]
+    finally:
+        await server.stop()
+
+def format_report(rows):
+    lines = [f"{'conc':>5} {'reqs':>5} {'p50(s)':>8} {'p95(s)':>8} {'p99(s)':>8} {'req/s':>7} {'llm':>5} {'search':>6} {'iters':>5}"]
+    for r in rows:
+        lines.append(f"{r['concurrency']:>5} {r['requests']:>5} {r['p50']:>8.3f} {r['p95']:>8.3f} {r['p99']:>8.3f} "
+                     f"{r['throughput']:>7.2f} {r['llm_calls']:>5} {r['searches']:>6} {r['iterations']:>5.2f}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AiQuery benchmark against a fake Ollama server and recorded searches")
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels to run")
+    parser.add_argument("-n", "--requests", type=int, default=32, help="Flows per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake prompt evaluation time per LLM call (s)")
+    parser.add_argument("--tps", type=float, default=200.0, help="Fake generation speed (tokens/s)")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="Recorded search latency (s)")
+    parser.add_argument("--parallel", type=int, default=4, help="Ollama slots admitted at once (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--fanout", type=int, default=1, help="Search queries per attempt")
+    parser.add_argument("--speculative", action="store_true", help="Overlap answer generation with the relevance check")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run_benchmark(
+        args.concurrency, args.requests, latency=args.latency, tokens_per_sec=args.tps,
+        search_latency=args.search_latency, max_parallel=args.parallel,
+        fanout=args.fanout, speculative=args.speculative
+    ))
+    print(json.dumps(rows, indent=2) if args.json else format_report(rows))
+
+if __name__ == "__main__":
+    main()
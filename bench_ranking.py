@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2026 Rogerio O. Ferraz
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import random
+import timeit
+import argparse
+from ranking import clean_snippet, rank_snippets, SnippetStore
+
+def legacy_rank_context(search_query, context_list):
+    """The keyword-substring scorer used before BM25, kept as a baseline."""
+    cleaned_list = [clean_snippet(snippet) for snippet in context_list]
+    keywords = [word.lower() for word in search_query.split() if len(word) > 2]
+
+    def rank_score(text):
+        text_lower = text.lower()
+        score = sum(10 for k in keywords if k in text_lower)
+        if re.search(r'\d+\s*graus', text_lower):
+            score += 1
+        return score
+
+    return sorted(cleaned_list, key=rank_score, reverse=True)[:5]
+
+WORDS = (
+    "clima tempo previsão chuva sol Londres Paris São Paulo capital França Oscar filme "
+    "ganhador 2024 notícias política economia Palmeiras jogo vitória temperatura mínima "
+    "máxima graus cidade europa hoje amanhã semana resultado"
+).split()
+
+def make_snippets(n, rng):
+    snippets = []
+    for i in range(n):
+        words = rng.choices(WORDS, k=rng.randint(12, 40))
+        if rng.random() < 0.2:
+            words.append(f"{rng.randint(5, 35)}º")
+        snippets.append(f"Result: Título {rng.random():.6f} - " + " ".join(words))
+    return snippets
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of snippet ranking (legacy scorer vs BM25)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000], help="Snippet counts to rank")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per size")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    query = "Compare o clima de Londres e Paris hoje"
+    print(f"{'snippets':>9} {'legacy (ms)':>12} {'bm25 (ms)':>10} {'store step (ms)':>16}")
+    for size in args.sizes:
+        snippets = make_snippets(size, rng)
+        legacy = timeit.timeit(lambda: legacy_rank_context(query, snippets), number=args.repeat) / args.repeat
+        bm25 = timeit.timeit(lambda: rank_snippets(query, [clean_snippet(s) for s in snippets]), number=args.repeat) / args.repeat
+
+        # Incremental cost of one more search (10 results) on top of `size` stored snippets
+        store = SnippetStore(query, history=snippets)
+        batches = iter([make_snippets(10, rng) for _ in range(args.repeat)])
+        def incremental():
+            store.ingest(next(batches), query)
+            return store.top()
+        step = timeit.timeit(incremental, number=args.repeat) / args.repeat
+
+        print(f"{size:>9} {legacy * 1000:>12.3f} {bm25 * 1000:>10.3f} {step * 1000:>16.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+# MIT License
+
+# Copyright (c) 2026 Rogerio O. Ferraz
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from ranking import query_terms, WEATHER_TOKEN
+
+def normalize_query(text):
+    """Case and whitespace insensitive form of a query, used in cache keys."""
+    return " ".join(text.lower().split())
+
+_COMBINING_RE = re.compile('[\u0300-\u036f]')
+_NON_WORD_RE = re.compile(r'[^\w]+')
+
+# Short words that never tell two questions apart ("a capital da França")
+FILLER_WORDS = frozenset({
+    'a', 'o', 'as', 'os', 'e', 'da', 'de', 'do', 'das', 'dos', 'em', 'no', 'na', 'nos', 'nas',
+    'um', 'que', 'se', 'por', 'pra', 'com', 'ao', 'qual', 'the', 'of', 'in', 'on', 'is', 'an',
+    'to', 'for', 'and', 'how', 'who', 'whats',
+})
+
+# Questions about the current state of things; their answers expire sooner
+TIME_SENSITIVE_WORDS = frozenset({
+    'hoje', 'agora', 'amanha', 'ontem', 'atual', 'atualmente', 'ultimas', 'ultimo', 'noticias',
+    'cotacao', 'placar', 'today', 'now', 'tomorrow', 'yesterday', 'current', 'latest', 'news',
+})
+
+def normalize_question(text):
+    """Case, accent, punctuation and whitespace insensitive form of a question."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return " ".join(_NON_WORD_RE.sub(" ", _COMBINING_RE.sub("", text)).split())
+
+def is_time_sensitive(question):
+    """Weather questions, and questions about today or the latest news."""
+    if WEATHER_TOKEN in query_terms(question):
+        return True
+    return not TIME_SENSITIVE_WORDS.isdisjoint(normalize_question(question).split())
+
+def _anchors(normalized):
+    # Numbers and short names ("SP", "RJ", "2024") must match for a similarity hit
+    return frozenset(w for w in normalized.split() if w not in FILLER_WORDS and (len(w) <= 3 or any(c.isdigit() for c in w)))
+
+class SearchCache:
+    """
+    Persistent search result cache backed by a SQLite file.
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the cache holds more than `max_entries`.
+    """
+    def __init__(self, path, ttl=3600, max_entries=5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, results TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed ON search_cache(accessed)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(query, region, max_results):
+        return f"{region}|{max_results}|{normalize_query(query)}"
+
+    def get(self, query, region, max_results):
+        """Returns the cached results, or None on a miss or an expired entry."""
+        key = self.make_key(query, region, max_results)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT results, created FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE search_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, query, region, max_results, results):
+        key = self.make_key(query, region, max_results)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results, ensure_ascii=False), now, now)
+            )
+            # Size bound: drop the least recently used entries beyond the limit
+            self._db.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                "SELECT key FROM search_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class LLMCache:
+    """
+    Prompt-level cache for LLM responses: an in-memory LRU in front of an
+    optional SQLite file, so answers also survive process restarts.
+    """
+    def __init__(self, max_entries=512, ttl=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            if path != ":memory:" and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    @property
+    def persistent(self):
+        return self._db is not None
+
+    @staticmethod
+    def make_key(model, prompt, options=None):
+        payload = json.dumps({'model': model, 'prompt': prompt, 'options': options or {}}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response dict, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, entry)
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None:
+                    self._forget(key)
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key, response):
+        entry = (dict(response), time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry[0], ensure_ascii=False, default=str), entry[1])
+                )
+                self._db.commit()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, key):
+        self._memory.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._memory)}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+
+class AnswerCache:
+    """
+    End-to-end cache of final answers. Questions hit when their normalized
+    forms are equal or, when embedding vectors are given, when their cosine
+    similarity reaches `similarity` and they mention the same numbers and
+    short names. Vectors live in one growing NumPy matrix, one row per entry.
+    Each entry has its own TTL; the least recently used are evicted.
+    """
+    def __init__(self, max_entries=1000, similarity=0.92):
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (answer, expires, anchors, row)
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._row_keys = []
+        self._free_rows = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_exact(self, question):
+        """
+        Returns the cached answer for `question` (up to normalization), or None
+        without counting a miss: callers embed the question and call get() next.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get(self, question, vector=None):
+        """Returns the cached answer for `question` or a near-identical one, or None."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._forget(key)
+                entry = None
+            if entry is None and vector is not None:
+                key = self._nearest(key, vector, now)
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None:
+                    self.similar_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question, answer, ttl, vector=None):
+        key = normalize_question(question)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            row = old[3] if old is not None else None
+            # Evict first, so the new vector can take a freed row
+            while len(self._entries) >= self.max_entries:
+                self._forget(next(iter(self._entries)))
+            if vector is not None:
+                row = self._store_vector(key, vector, row)
+            elif row is not None:
+                self._release_row(row)
+                row = None
+            self._entries[key] = (answer, time.time() + ttl, _anchors(key), row)
+
+    def _nearest(self, key, vector, now):
+        import numpy as np
+        if self._matrix is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or query.shape[0] != self._matrix.shape[1]:
+            return None
+        scores = self._matrix[:len(self._row_keys)] @ (query / norm)
+        anchors = _anchors(key)
+        for row in np.argsort(-scores):
+            if scores[row] < self.similarity:
+                break
+            candidate = self._row_keys[row]
+            entry = self._entries.get(candidate) if candidate is not None else None
+            if entry is None:
+                continue
+            if entry[1] <= now:
+                self._forget(candidate)
+            elif entry[2] == anchors:
+                return candidate
+        return None
+
+    def _store_vector(self, key, vector, row):
+        import numpy as np
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return row
+        if self._matrix is None:
+            self._matrix = np.zeros((16, vector.shape[0]), dtype=np.float32)
+        if vector.shape[0] != self._matrix.shape[1]:
+            # Another embedding model: vectors are not comparable
+            return row
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = len(self._row_keys)
+                self._row_keys.append(None)
+                if row == len(self._matrix):
+                    self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[row] = vector / norm
+        self._row_keys[row] = key
+        return row
+
+    def _release_row(self, row):
+        self._matrix[row] = 0
+        self._row_keys[row] = None
+        self._free_rows.append(row)
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[3] is not None:
+            self._release_row(entry[3])
+
+    def stats(self):
+        return {'hits': self.hits, 'similar_hits': self.similar_hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+class _Session:
+    __slots__ = ('turns', 'snippets', 'bytes', 'clock')
+
+    def __init__(self):
+        self.turns = deque()  # (question, answer), oldest first
+        self.snippets = {}  # interned text -> [reuses, last turn used]
+        self.bytes = 0
+        self.clock = 0
+
+class SessionMemory:
+    """
+    Bounded memory of conversations, so follow-up questions start from the
+    evidence found for the earlier ones. Each session keeps its last
+    `max_turns` questions and answers and the best snippets found for them.
+    Snippet texts are interned: sessions holding the same snippet share one
+    string. A session over `session_bytes` drops its least useful snippets
+    (fewest reuses, then least recently used) and then its oldest turns; over
+    `max_bytes` in total, the least recently active sessions are dropped.
+    """
+    def __init__(self, session_bytes=256 * 1024, max_bytes=64 * 1024 * 1024, max_turns=5, max_answer_chars=1000):
+        self.session_bytes = session_bytes
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.max_answer_chars = max_answer_chars
+        self.bytes = 0
+        self.evicted_sessions = 0
+        self._sessions = OrderedDict()
+        self._texts = {}  # text -> [interned text, sessions holding it]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def recall(self, session):
+        """Returns the session's (turns, snippets), snippets most useful first."""
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is None:
+                return [], []
+            self._sessions.move_to_end(session)
+            ranked = sorted(entry.snippets.items(), key=lambda item: (-item[1][0], -item[1][1]))
+            return list(entry.turns), [text for text, _ in ranked]
+
+    def remember(self, session, question, answer, snippets):
+        """Adds a turn and the snippets it was answered from; known snippets count as reused."""
+        answer = answer[:self.max_answer_chars]
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is None:
+                entry = self._sessions[session] = _Session()
+            self._sessions.move_to_end(session)
+            entry.clock += 1
+            for text in snippets:
+                known = entry.snippets.get(text)
+                if known is not None:
+                    known[0] += 1
+                    known[1] = entry.clock
+                    continue
+                entry.snippets[self._intern(text)] = [0, entry.clock]
+                entry.bytes += sys.getsizeof(text)
+            entry.turns.append((question, answer))
+            size = sys.getsizeof(question) + sys.getsizeof(answer)
+            entry.bytes += size
+            self.bytes += size
+            while len(entry.turns) > self.max_turns:
+                self._drop_turn(entry)
+            self._shrink(entry)
+            # Whole sessions go, least recently active first, but never the current one
+            while self.bytes > self.max_bytes and len(self._sessions) > 1:
+                oldest = next(iter(self._sessions))
+                self._drop_session(oldest)
+                self.evicted_sessions += 1
+
+    def forget(self, session):
+        with self._lock:
+            if session in self._sessions:
+                self._drop_session(session)
+
+    def _shrink(self, entry):
+        while entry.bytes > self.session_bytes and entry.snippets:
+            victim = min(entry.snippets.items(), key=lambda item: item[1])[0]
+            del entry.snippets[victim]
+            entry.bytes -= sys.getsizeof(victim)
+            self._release(victim)
+        while entry.bytes > self.session_bytes and len(entry.turns) > 1:
+            self._drop_turn(entry)
+
+    def _drop_turn(self, entry):
+        question, answer = entry.turns.popleft()
+        size = sys.getsizeof(question) + sys.getsizeof(answer)
+        entry.bytes -= size
+        self.bytes -= size
+
+    def _drop_session(self, session):
+        entry = self._sessions.pop(session)
+        for text in entry.snippets:
+            self._release(text)
+        while entry.turns:
+            self._drop_turn(entry)
+
+    def _intern(self, text):
+        shared = self._texts.get(text)
+        if shared is None:
+            shared = self._texts[text] = [text, 0]
+            self.bytes += sys.getsizeof(text)
+        shared[1] += 1
+        return shared[0]
+
+    def _release(self, text):
+        shared = self._texts[text]
+        shared[1] -= 1
+        if shared[1] == 0:
+            del self._texts[text]
+            self.bytes -= sys.getsizeof(text)
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'bytes': self.bytes, 'snippets': len(self._texts),
+                    'evicted_sessions': self.evicted_sessions}
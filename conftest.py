@@ -0,0 +1,11 @@
+import pytest
+
+@pytest.fixture(autouse=True, scope="session")
+def runtime_files(tmp_path_factory):
+    # SearchBotBase() configures logging once per process and opens the search
+    # cache (and CLI tests start more processes): keep both out of the working tree
+    runtime = tmp_path_factory.mktemp("runtime")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("AIQUERY_LOG_FILE", str(runtime / "aiquery.log"))
+        mp.setenv("AIQUERY_SEARCH_CACHE", str(runtime / "aiquery_cache.sqlite"))
+        yield
@@ -0,0 +1,324 @@
+# MIT License
+
+# Copyright (c) 2026 Rogerio O. Ferraz
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import hashlib
+import functools
+import unicodedata
+from collections import defaultdict
+
+# numpy is imported by the functions using it, so importing this module stays cheap
+
+_DEGREES_RE = re.compile(r'(\d+(?:\.\d+)?)[\s]?[°º]')
+_MIN_RE = re.compile(r'Min:?\s*(\d+)', flags=re.IGNORECASE)
+_MAX_RE = re.compile(r'Max:?\s*(\d+)', flags=re.IGNORECASE)
+_WEATHER_RE = re.compile(r'\d+\s*graus')
+_TOKEN_RE = re.compile(r'\w{3,}')
+_WORD_RE = re.compile(r'\w+')
+_PIECE_RE = re.compile(r'\w+|[^\w\s]')
+
+# Combining marks left by NFKD decomposition ("ç" -> "c" + U+0327)
+_COMBINING_RE = re.compile('[\u0300-\u036f]')
+
+# Snippets with temperature readings carry this extra token, and weather
+# questions search for it, so "21 graus" counts as a match for "clima"
+WEATHER_TOKEN = '__weather__'
+WEATHER_TERMS = frozenset({'temperatura', 'clima', 'tempo', 'previsao', 'grau', 'weather', 'temperature', 'forecast'})
+
+STOPWORDS = frozenset({
+    # Portuguese
+    'que', 'para', 'com', 'uma', 'um', 'dos', 'das', 'nos', 'nas', 'por', 'pelo', 'pela',
+    'como', 'mais', 'mas', 'foi', 'ser', 'esta', 'este', 'isso', 'qual', 'quais',
+    'quem', 'onde', 'quando', 'entre', 'sobre', 'seu', 'sua', 'hoje',
+    # English
+    'the', 'and', 'for', 'with', 'that', 'this', 'are', 'was', 'what', 'which', 'who',
+    'how', 'from', 'about', 'today', 'result',
+})
+
+# Characters per extra subword token in long words, close to Llama/Qwen tokenizers on Portuguese
+SUBWORD_CHARS = 6
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def clean_snippet(text):
+    """
+    Pre-processes snippets to make them more LLM-friendly, 
+    especially for cryptic weather formats.
+    """
+    # Transform "21.9º" or "25°" into "21.9 graus"
+    text = _DEGREES_RE.sub(r'\1 graus', text)
+    # Transform "Min: 20 Max: 30" into more explicit text
+    text = _MIN_RE.sub(r'Mínima: \1', text)
+    text = _MAX_RE.sub(r'Máxima: \1', text)
+    return text
+
+def tokenize(text):
+    """Accent-insensitive lowercase tokens, without short words and stopwords."""
+    text = text.lower()
+    if not text.isascii():
+        text = _COMBINING_RE.sub('', unicodedata.normalize('NFKD', text))
+    # Crude plural folding, shared by Portuguese and English ("filmes", "winners")
+    return [
+        word[:-1] if len(word) > 4 and word[-1] == 's' else word
+        for word in _TOKEN_RE.findall(text)
+        if word not in STOPWORDS
+    ]
+
+def query_terms(query):
+    """Distinct search terms of a query, plus the weather token for weather questions."""
+    terms = []
+    for token in tokenize(query):
+        if token not in terms:
+            terms.append(token)
+    if WEATHER_TERMS.intersection(terms):
+        terms.append(WEATHER_TOKEN)
+    return terms
+
+def snippet_tokens(text):
+    """Tokens of an already cleaned snippet."""
+    tokens = tokenize(text)
+    if _WEATHER_RE.search(text.lower()):
+        tokens.append(WEATHER_TOKEN)
+    return tokens
+
+def term_frequencies(terms, documents):
+    """
+    Builds the (documents x terms) frequency matrix of the query terms and
+    the document lengths, the only inputs BM25 needs.
+    """
+    import numpy as np
+    tf = np.zeros((len(documents), len(terms)))
+    lengths = np.empty(len(documents))
+    for row, tokens in enumerate(documents):
+        lengths[row] = len(tokens)
+        tf[row] = [tokens.count(term) for term in terms]
+    return tf, lengths
+
+def bm25_scores(tf, lengths, weather=None):
+    """Vectorized BM25 over all documents at once."""
+    import numpy as np
+    n_docs = tf.shape[0]
+    if n_docs == 0:
+        return np.zeros(0)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    avgdl = lengths.mean() or 1.0
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avgdl)
+    scores = (tf * (BM25_K1 + 1) / (tf + norm[:, None])) @ idf
+    if weather is not None:
+        # Tiny bonus for weather patterns to break ties, as the old scorer did
+        scores = scores + 1e-3 * weather
+    return scores
+
+def _weather_flags(documents):
+    import numpy as np
+    return np.array([WEATHER_TOKEN in tokens for tokens in documents], dtype=float)
+
+def rank_snippets(query, snippets, limit=5, documents=None):
+    """
+    Returns the `limit` cleaned snippets most relevant to `query` under BM25.
+    Ties keep the input order. `documents` may carry precomputed tokens.
+    """
+    import numpy as np
+    if documents is None:
+        documents = [snippet_tokens(s) for s in snippets]
+    tf, lengths = term_frequencies(query_terms(query), documents)
+    scores = bm25_scores(tf, lengths, _weather_flags(documents))
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return [snippets[i] for i in order]
+
+def term_coverage(query, snippets):
+    """
+    Share of the query terms found in at least one (cleaned) snippet, and the
+    missing terms. Returns (None, []) for queries without searchable terms.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return None, []
+    found = set()
+    for text in snippets:
+        found.update(snippet_tokens(text))
+    if WEATHER_TOKEN in found:
+        # A temperature reading answers "clima", "tempo", ...
+        found.update(WEATHER_TERMS)
+    missing = [term for term in terms if term not in found]
+    return 1 - len(missing) / len(terms), missing
+
+@functools.lru_cache(maxsize=65536)
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def fingerprint_features(text):
+    """Accent-insensitive words of a snippet for SimHash, keeping short words and numbers."""
+    text = text.lower()
+    if not text.isascii():
+        text = _COMBINING_RE.sub('', unicodedata.normalize('NFKD', text))
+    return [word for word in _WORD_RE.findall(text) if word not in STOPWORDS]
+
+def simhash(tokens):
+    """64-bit SimHash fingerprint of a token list."""
+    import numpy as np
+    if not tokens:
+        return 0
+    hashes = np.array([_token_hash(t) for t in tokens], dtype=np.uint64)
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(len(tokens), 64)
+    # Each bit is set when most tokens vote for it
+    majority = bits.sum(axis=0) * 2 > len(tokens)
+    return int(np.packbits(majority).view(np.uint64)[0])
+
+class NearDuplicateIndex:
+    """
+    SimHash index answering "is there a fingerprint within `max_distance`
+    bits?". Fingerprints are split into max_distance + 1 bands, so any near
+    duplicate shares at least one whole band and only bucket mates are compared.
+    """
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.width = 64 // self.bands
+        self._mask = (1 << self.width) - 1
+        self._buckets = defaultdict(list)
+
+    def _keys(self, fingerprint):
+        return [(band, (fingerprint >> (band * self.width)) & self._mask) for band in range(self.bands)]
+
+    def contains(self, fingerprint):
+        for key in self._keys(fingerprint):
+            for other in self._buckets.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return True
+        return False
+
+    def add(self, fingerprint):
+        for key in self._keys(fingerprint):
+            self._buckets[key].append(fingerprint)
+
+@functools.lru_cache(maxsize=4096)
+def estimate_tokens(text):
+    """
+    Fast token count estimate: one token per word or punctuation mark, plus
+    one per SUBWORD_CHARS characters of long words. Errs slightly high.
+    """
+    return sum(1 + (len(piece) - 1) // SUBWORD_CHARS for piece in _PIECE_RE.findall(text))
+
+def pack_context(snippets, budget):
+    """
+    Greedily fills a token `budget` with whole snippets, in the given (ranked)
+    order, skipping duplicates and snippets that no longer fit. Returns the
+    packed snippets and their estimated token count.
+    """
+    packed, seen, used = [], set(), 0
+    for snippet in snippets:
+        if snippet in seen:
+            continue
+        seen.add(snippet)
+        # Each snippet is followed by a newline, about one token
+        cost = estimate_tokens(snippet) + 1
+        if used + cost <= budget:
+            packed.append(snippet)
+            used += cost
+    return packed, used
+
+class SnippetStore:
+    """
+    Per-flow store of search snippets ranked against the user question.
+    Each snippet is cleaned and tokenized once on ingest, duplicates are
+    rejected with a set lookup (near duplicates with a SimHash index), and its
+    query term counts are appended to a growing matrix so ranking is one
+    vectorized BM25 pass. `max_distance=None` disables near-duplicate checks.
+    """
+    def __init__(self, query, top_k=5, history=None, max_distance=6):
+        import numpy as np
+        self.terms = query_terms(query)
+        self.top_k = top_k
+        self.history = []
+        self.near_duplicates = 0
+        self._seen = set()
+        self._near = NearDuplicateIndex(max_distance) if max_distance is not None else None
+        self._tf = np.zeros((16, len(self.terms)))
+        self._lengths = np.zeros(16)
+        self._weather = np.zeros(16)
+        self._top = None
+        for snippet in history or []:
+            self.add(snippet)
+
+    def __len__(self):
+        return len(self.history)
+
+    def __contains__(self, snippet):
+        return clean_snippet(snippet) in self._seen
+
+    def add(self, snippet):
+        """Cleans and stores a snippet. Returns False if it was already known."""
+        text = clean_snippet(snippet)
+        return self._add_clean(text, snippet_tokens(text))
+
+    def ingest(self, snippets, query, limit=5):
+        """
+        Cleans a batch of search results once, keeps the `limit` best ones for
+        the search `query` and stores them. Returns how many were new.
+        """
+        cleaned = [clean_snippet(s) for s in snippets]
+        documents = [snippet_tokens(text) for text in cleaned]
+        tokens = dict(zip(cleaned, documents))
+        best = rank_snippets(query, cleaned, limit, documents)
+        return sum(self._add_clean(text, tokens[text]) for text in best)
+
+    def _add_clean(self, text, tokens):
+        import numpy as np
+        if text in self._seen:
+            return False
+        self._seen.add(text)
+        if self._near is not None:
+            # Same story from another query, with a different title or truncation
+            fingerprint = simhash(fingerprint_features(text))
+            if self._near.contains(fingerprint):
+                self.near_duplicates += 1
+                return False
+            self._near.add(fingerprint)
+
+        row = len(self.history)
+        if row == len(self._lengths):
+            # Grow the matrices geometrically so appends stay amortized O(1)
+            self._tf = np.concatenate([self._tf, np.zeros_like(self._tf)])
+            self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+            self._weather = np.concatenate([self._weather, np.zeros_like(self._weather)])
+        self._tf[row] = [tokens.count(term) for term in self.terms]
+        self._lengths[row] = len(tokens)
+        self._weather[row] = WEATHER_TOKEN in tokens
+        self.history.append(text)
+        self._top = None
+        return True
+
+    def ranked(self):
+        """All stored snippets, most relevant to the user question first."""
+        import numpy as np
+        if self._top is None:
+            n = len(self.history)
+            scores = bm25_scores(self._tf[:n], self._lengths[:n], self._weather[:n])
+            self._top = [self.history[i] for i in np.argsort(-scores, kind='stable')]
+        return list(self._top)
+
+    def top(self):
+        """Best snippets for the user question, most relevant first."""
+        return self.ranked()[:self.top_k]
@@ -0,0 +1,345 @@
+# MIT License
+
+# Copyright (c) 2026 Rogerio O. Ferraz
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import time
+import signal
+import asyncio
+import logging
+import contextlib
+from urllib.parse import urlsplit, parse_qs
+from aiquery import get_shared_bot, TokenStream, run_flow, new_shared, parse_deadline
+from telemetry import Trace, METRICS
+
+logger = logging.getLogger("AiQuery")
+
+MAX_BODY = 64 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def read_options(data):
+    """Per-request run options accepted from clients, validated."""
+    options = {}
+    if 'fanout' in data:
+        options['fanout'] = max(1, min(int(data['fanout']), 8))
+    if 'speculative' in data:
+        value = data['speculative']
+        options['speculative'] = value.lower() in ("1", "true", "yes") if isinstance(value, str) else bool(value)
+    if 'deadline' in data:
+        # 0 turns off the server's default deadline (AIQUERY_DEADLINE)
+        options['deadline'] = parse_deadline(data['deadline']) or None
+    if data.get('session'):
+        # Questions with the same session id are a conversation: follow-ups reuse its evidence
+        session = str(data['session'])
+        if len(session) > 128:
+            raise ValueError("session id longer than 128 characters")
+        options['session'] = session
+    return options
+
+def parse_address(spec, default_host="127.0.0.1"):
+    """Parses 'HOST:PORT', ':PORT' or 'PORT'."""
+    host, _, port = spec.rpartition(":")
+    return host or default_host, int(port)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+class QueryServer:
+    """
+    Minimal HTTP/1.1 API on the running event loop:
+
+    - POST /query {"query": ...}: answers and returns the result as JSON,
+      with per-node timings and iterations.
+    - GET /stream?query=... or POST /stream: Server-Sent Events with the
+      node progress ('progress'), answer attempts ('start'), answer tokens
+      ('token') and the final result ('done') or an 'error'.
+    - GET /health and GET /metrics.
+
+    At most `concurrency` flows run at once and up to `max_pending` requests
+    wait for a turn; beyond that clients get 503. shutdown() stops accepting
+    connections and lets running requests finish within a grace period.
+    """
+    def __init__(self, bot, concurrency=4, max_pending=None):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_pending = max_pending if max_pending is not None else concurrency * 4
+        self.pending = 0
+        self.running = 0
+        self.served = 0
+        self.closing = False
+        self._limit = asyncio.Semaphore(concurrency)
+        self._server = None
+        self.port = None
+        self._connections = set()
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        # Live gauges (caches, coalescing, Ollama hosts, sessions) for /metrics
+        METRICS.sources.append(self.bot.metrics)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def shutdown(self, grace=30.0):
+        """Stops accepting requests, waits up to `grace` seconds for running ones, then cancels the rest."""
+        self.closing = True
+        self._server.close()
+        with contextlib.suppress(ValueError):
+            METRICS.sources.remove(self.bot.metrics)
+        try:
+            await asyncio.wait_for(self._idle.wait(), grace)
+        except asyncio.TimeoutError:
+            logger.warning(f"Shutdown grace period over, cancelling {self._active} request(s)")
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def answer(self, query, options=None, progress=None, tokens=None):
+        """Runs (or answers from cache) one question and returns the result dict."""
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, "Too many pending queries, try again later")
+        self.pending += 1
+        try:
+            async with self._limit:
+                trace = Trace(query)
+                shared = new_shared(self.bot, query, trace=trace, **(options or {}))
+                if progress is not None:
+                    shared['progress'] = progress
+                if tokens is not None:
+                    shared['tokens'] = tokens
+                logger.info(f"API query {shared['query_id']}: '{query}'")
+                start = time.perf_counter()
+                self.running += 1
+                try:
+                    await run_flow(shared)
+                finally:
+                    self.running -= 1
+                    METRICS.observe(trace)
+                    self.served += 1
+        finally:
+            self.pending -= 1
+
+        timings = {}
+        for span in trace.spans:
+            timings[span.node] = round(timings.get(span.node, 0) + span.duration, 4)
+        return {
+            'id': shared['query_id'],
+            'query': query,
+            'answer': shared.get('answer'),
+            'iterations': shared.get('iteration', 0),
+            'cached': bool(shared.get('cached_answer')),
+            'elapsed': round(time.perf_counter() - start, 3),
+            'timings': timings,
+            'llm_calls': len(trace.llm_calls),
+            'deadline_cuts': shared.get('deadline_cuts', []),
+        }
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            # Keep-alive: serve requests until the client or the server closes
+            while not self.closing:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                self._active += 1
+                self._idle.clear()
+                try:
+                    keep_alive = await self._dispatch(*request, writer)
+                finally:
+                    self._active -= 1
+                    if self._active == 0:
+                        self._idle.set()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            if not self.closing:
+                raise
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._send_json(writer, 400, {'error': "Malformed request line"}, keep_alive=False)
+            return None
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._send_json(writer, 400, {'error': "Invalid Content-Length"}, keep_alive=False)
+            return None
+        if length > MAX_BODY:
+            await self._send_json(writer, 413, {'error': "Request body too large"}, keep_alive=False)
+            return None
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _dispatch(self, method, target, headers, body, writer):
+        url = urlsplit(target)
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        try:
+            if url.path == "/health":
+                self._allow(method, "GET")
+                await self._send_json(writer, 200, {
+                    'status': "closing" if self.closing else "ok",
+                    'running': self.running, 'pending': self.pending - self.running,
+                    'served': self.served,
+                }, keep_alive)
+            elif url.path == "/metrics":
+                self._allow(method, "GET")
+                await self._send(writer, 200, METRICS.render().encode("utf-8"),
+                                 "text/plain; version=0.0.4; charset=utf-8", keep_alive)
+            elif url.path == "/query":
+                self._allow(method, "POST")
+                query, options = self._parse_query(method, url, body)
+                await self._send_json(writer, 200, await self.answer(query, options), keep_alive)
+            elif url.path == "/stream":
+                self._allow(method, "GET", "POST")
+                query, options = self._parse_query(method, url, body)
+                await self._stream(writer, query, options)
+                return False
+            else:
+                raise HTTPError(404, f"No route for {url.path}")
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {'error': str(e)}, keep_alive)
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logger.error(f"API request {method} {url.path} failed: {e}")
+            await self._send_json(writer, 500, {'error': str(e)}, keep_alive=False)
+            return False
+        return keep_alive
+
+    @staticmethod
+    def _allow(method, *allowed):
+        if method not in allowed:
+            raise HTTPError(405, f"Use {' or '.join(allowed)}")
+
+    @staticmethod
+    def _parse_query(method, url, body):
+        if method == "GET":
+            data = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        else:
+            try:
+                data = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Body must be JSON")
+            if not isinstance(data, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+        query = str(data.get('query', '')).strip()
+        if not query:
+            raise HTTPError(400, "Missing 'query'")
+        try:
+            return query, read_options(data)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, f"Invalid option: {e}")
+
+    async def _stream(self, writer, query, options):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        await writer.drain()
+
+        events = TokenStream()
+        def progress(value, desc=""):
+            events.put('progress', json.dumps({'progress': value, 'desc': desc}, ensure_ascii=False))
+
+        task = asyncio.create_task(self.answer(query, options, progress=progress, tokens=events))
+        task.add_done_callback(lambda _: events.close())
+        try:
+            async for kind, text in events:
+                if kind == 'progress':
+                    writer.write(f"event: progress\ndata: {text}\n\n".encode("utf-8"))
+                else:
+                    writer.write(sse_event(kind, {'text': text}))
+                await writer.drain()
+            result = await task
+            writer.write(sse_event('done', result))
+        except HTTPError as e:
+            writer.write(sse_event('error', {'status': e.status, 'error': str(e)}))
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logger.error(f"API stream for '{query}' failed: {e}")
+            writer.write(sse_event('error', {'status': 500, 'error': str(e)}))
+        finally:
+            # The client went away (or the server is stopping): stop the flow
+            task.cancel()
+            with contextlib.suppress(BaseException):
+                await task
+        with contextlib.suppress(ConnectionError):
+            await writer.drain()
+
+    async def _send_json(self, writer, status, data, keep_alive=True):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json; charset=utf-8", keep_alive)
+
+    async def _send(self, writer, status, body, content_type, keep_alive=True):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+async def serve(host="127.0.0.1", port=8080, concurrency=4, grace=30.0):
+    """Runs the API until SIGINT/SIGTERM, then shuts down gracefully."""
+    bot = get_shared_bot()
+    # Load the model before the first request and keep it loaded while idle
+    if bot.warmup or bot.keep_warm > 0:
+        bot.start_keep_warm(bot.keep_warm)
+    server = await QueryServer(bot, concurrency).start(host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    msg = f"[*] AiQuery API listening on http://{host}:{server.port} (POST /query, GET /stream?query=...)"
+    print(msg)
+    logger.info(msg)
+    try:
+        await stop.wait()
+    finally:
+        msg = "[*] Shutting down, finishing running queries..."
+        print(msg)
+        logger.info(msg)
+        await server.shutdown(grace)
@@ -0,0 +1,300 @@
+# MIT License
+
+# Copyright (c) 2026 Rogerio O. Ferraz
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+import contextvars
+from collections import defaultdict
+
+# Ollama reports durations in nanoseconds
+_NS = 1e9
+LLM_FIELDS = ('prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration',
+              'load_duration', 'total_duration')
+
+class Span:
+    """One node execution inside a flow run."""
+    def __init__(self, node, iteration, start):
+        self.node = node
+        self.iteration = iteration
+        self.start = start
+        self.end = None
+        self.action = None
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+class Trace:
+    """
+    Per-run record of node spans and LLM call statistics, kept in shared['trace'].
+    Times are seconds relative to the start of the trace.
+    """
+    def __init__(self, query=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.query = query
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self.llm_calls = []
+
+    def start_span(self, node, iteration):
+        span = Span(node, iteration, time.perf_counter())
+        self.spans.append(span)
+        return span
+
+    def end_span(self, span, action, iteration=None):
+        span.end = time.perf_counter()
+        span.action = action
+        if iteration is not None:
+            span.iteration = iteration
+
+    def record_llm(self, node, model, response):
+        """Keeps the timing fields Ollama returns with a (final) generate response."""
+        call = {'node': node, 'model': str(model), 'cached': bool(response.get('cached', False))}
+        for field in LLM_FIELDS:
+            call[field] = response.get(field)
+        if call['eval_count'] and call['eval_duration']:
+            call['tokens_per_sec'] = round(call['eval_count'] / (call['eval_duration'] / _NS), 2)
+        else:
+            call['tokens_per_sec'] = None
+        self.llm_calls.append(call)
+
+    def events(self):
+        """The trace as a list of JSON-serializable events."""
+        events = []
+        for span in self.spans:
+            events.append({
+                'type': 'span', 'trace': self.id, 'node': span.node, 'iteration': span.iteration,
+                'start': round(span.start - self._origin, 4), 'duration': round(span.duration, 4),
+                'action': span.action,
+            })
+        for call in self.llm_calls:
+            events.append({'type': 'llm', 'trace': self.id, **call})
+        return events
+
+    def to_jsonl(self):
+        header = {'type': 'trace', 'trace': self.id, 'query': self.query, 'started_at': self.started_at}
+        return "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in [header] + self.events())
+
+    def write_jsonl(self, path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+
+    def report(self):
+        """Human readable table of spans and LLM calls."""
+        lines = [f"[TRACE {self.id}]", f"{'node':<10} {'iter':>4} {'start':>8} {'dur(s)':>8}  action"]
+        for span in self.spans:
+            lines.append(f"{span.node:<10} {span.iteration:>4} {span.start - self._origin:>8.2f} "
+                         f"{span.duration:>8.2f}  {span.action}")
+        if self.llm_calls:
+            lines.append(f"{'llm call':<10} {'model':<16} {'prompt':>7} {'gen':>6} {'tok/s':>7} {'load(s)':>8}")
+            for call in self.llm_calls:
+                load = (call['load_duration'] or 0) / _NS
+                lines.append(
+                    f"{call['node']:<10} {call['model'][:16]:<16} {call['prompt_eval_count'] or 0:>7} "
+                    f"{call['eval_count'] or 0:>6} {call['tokens_per_sec'] or 0:>7.1f} {load:>8.2f}"
+                    + ("  (cached)" if call['cached'] else "")
+                )
+        return "\n".join(lines)
+
+class LatencyModel:
+    """
+    Running estimates of how long each node takes and how fast each model
+    writes, as exponential moving averages over finished work. Runs with a
+    deadline plan their remaining steps with them.
+    """
+    DEFAULT_NODE_SECONDS = {'querygen': 3.0, 'search': 2.0, 'relevance': 3.0, 'answer': 15.0, 'review': 3.0}
+    DEFAULT_TOKENS_PER_SEC = 15.0
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._node_seconds = dict(self.DEFAULT_NODE_SECONDS)
+        self._tokens_per_sec = {}
+
+    def _update(self, table, key, value):
+        with self._lock:
+            old = table.get(key)
+            table[key] = value if old is None else old + self.alpha * (value - old)
+
+    def observe_node(self, node, seconds):
+        self._update(self._node_seconds, node, seconds)
+
+    def observe_llm(self, model, response):
+        """Learns the model's generation speed from a (final) generate response."""
+        count, duration = response.get('eval_count'), response.get('eval_duration')
+        if count and duration and not response.get('cached'):
+            self._update(self._tokens_per_sec, str(model), count / (duration / _NS))
+
+    def node_seconds(self, *nodes):
+        """Expected seconds to run all of `nodes` once."""
+        with self._lock:
+            return sum(self._node_seconds.get(node, 0.0) for node in nodes)
+
+    def tokens_per_sec(self, model):
+        with self._lock:
+            return self._tokens_per_sec.get(str(model), self.DEFAULT_TOKENS_PER_SEC)
+
+class Metrics:
+    """
+    Process-wide aggregates of finished traces, rendered in the Prometheus
+    text format. Live gauges (cache hits, Ollama queue) come from `sources`,
+    callables returning {metric_name: value}.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self.sources = []
+
+    def observe(self, trace):
+        with self._lock:
+            self._counters[('aiquery_flow_runs_total', ())] += 1
+            for span in trace.spans:
+                labels = (('node', span.node),)
+                self._counters[('aiquery_node_runs_total', labels)] += 1
+                self._counters[('aiquery_node_seconds_total', labels)] += span.duration
+            for call in trace.llm_calls:
+                labels = (('node', call['node']), ('model', call['model']))
+                self._counters[('aiquery_llm_calls_total', labels + (('cached', str(call['cached']).lower()),))] += 1
+                if call['cached']:
+                    continue
+                self._counters[('aiquery_llm_prompt_tokens_total', labels)] += call['prompt_eval_count'] or 0
+                self._counters[('aiquery_llm_completion_tokens_total', labels)] += call['eval_count'] or 0
+                self._counters[('aiquery_llm_eval_seconds_total', labels)] += (call['eval_duration'] or 0) / _NS
+                self._counters[('aiquery_llm_load_seconds_total', labels)] += (call['load_duration'] or 0) / _NS
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lines, typed = [], set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if labels else f"{name} {value:g}")
+        for source in self.sources:
+            for name, value in source().items():
+                # Gauge names may carry labels, e.g. 'aiquery_ollama_host_outstanding{host="..."}'
+                family = name.split("{", 1)[0]
+                if family not in typed:
+                    typed.add(family)
+                    lines.append(f"# TYPE {family} gauge")
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def start_metrics_server(port, host="0.0.0.0", metrics=METRICS):
+    """Serves `metrics` at http://host:port/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="aiquery-metrics", daemon=True).start()
+    return server
+
+# --- Logging ---
+
+# Fields of the flow run and node currently executing, attached to every log record
+LOG_CONTEXT = contextvars.ContextVar('aiquery_log_context', default={})
+LOG_FIELDS = ('query_id', 'node', 'iteration', 'duration')
+
+class LogContextFilter(logging.Filter):
+    """Copies LOG_CONTEXT onto records, in the thread and task that logged them."""
+    def filter(self, record):
+        for key, value in LOG_CONTEXT.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value() if callable(value) else value)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the flow fields (query id, node, iteration, duration) when known."""
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key in LOG_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+def setup_logging(path="aiquery.log", level="INFO", fmt="text", max_bytes=10 * 1024 * 1024, backups=5, when=None):
+    """
+    Routes log records through a queue to a background thread writing `path`,
+    so logging never does file I/O on the event loop. The file rotates at
+    `max_bytes`, or on a schedule when `when` is set ("midnight", "H", ...),
+    keeping `backups` old files. `fmt` is "text" or "json" (JSON lines).
+    Returns the QueueListener, which is also stopped at exit.
+    """
+    from queue import SimpleQueue
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+    if when:
+        handler = TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding="utf-8")
+    else:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    queue = SimpleQueue()
+    queue_handler = QueueHandler(queue)
+    queue_handler.addFilter(LogContextFilter())
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    class Listener(QueueListener):
+        def stop(self):
+            # Safe to call again at exit
+            if self._thread is not None:
+                super().stop()
+                handler.close()
+
+    listener = Listener(queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
@@ -0,0 +1,62 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+import aiquery
+from aiquery import OllamaClient, get_shared_bot
+
+class FakeOllama:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, model, prompt, stream=False, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        if stream:
+            return self._stream()
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        return {"response": prompt}
+
+    async def _stream(self):
+        try:
+            for word in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield {"response": word}
+        finally:
+            self.active -= 1
+
+@pytest.mark.asyncio
+async def test_admission_caps_in_flight_calls():
+    fake = FakeOllama()
+    client = OllamaClient(fake, max_parallel=2)
+    results = await asyncio.gather(*(client.generate(model="m", prompt=str(i)) for i in range(6)))
+    assert [r["response"] for r in results] == [str(i) for i in range(6)]
+    assert fake.peak == 2
+    assert client.in_flight == 0 and client.waiting == 0
+
+@pytest.mark.asyncio
+async def test_stream_holds_slot_until_closed():
+    fake = FakeOllama()
+    client = OllamaClient(fake, max_parallel=1)
+
+    stream = await client.generate(model="m", prompt="p", stream=True)
+    waiter = asyncio.create_task(client.generate(model="m", prompt="q"))
+    await asyncio.sleep(0.05)
+    assert not waiter.done()  # the stream still owns the only slot
+
+    await stream.__anext__()
+    await stream.aclose()
+    assert (await waiter)["response"] == "q"
+    assert client.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_exhausted_stream_releases_slot():
+    client = OllamaClient(FakeOllama(), max_parallel=1)
+    stream = await client.generate(model="m", prompt="p", stream=True)
+    assert [chunk["response"] async for chunk in stream] == ["a", "b", "c"]
+    assert client.in_flight == 0
+
+def test_shared_bot_is_process_wide():
+    with patch.object(aiquery, '_shared_bot', None):
+        assert get_shared_bot() is get_shared_bot()
@@ -0,0 +1,119 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from caching import AnswerCache, normalize_question, is_time_sensitive
+from aiquery import run_flow, TokenStream
+
+def test_exact_hits_ignore_case_accents_and_punctuation():
+    cache = AnswerCache()
+    cache.put("Qual a capital da França?", "Paris", ttl=60)
+    assert normalize_question(" QUAL a capital  da franca ") == "qual a capital da franca"
+    assert cache.get("qual a capital da frança") == "Paris"
+    assert cache.get("Qual a capital da Alemanha?") is None
+    assert cache.stats() == {'hits': 1, 'similar_hits': 0, 'misses': 1, 'entries': 1}
+
+def test_entries_expire_on_their_own_ttl():
+    cache = AnswerCache()
+    cache.put("clima em SP", "25 graus", ttl=0)
+    cache.put("capital da França", "Paris", ttl=60)
+    assert cache.get("clima em SP") is None
+    assert cache.get("capital da França") == "Paris"
+    assert len(cache) == 1
+
+def test_time_sensitive_questions():
+    assert is_time_sensitive("Como está o clima em SP?")
+    assert is_time_sensitive("Últimas notícias do Palmeiras")
+    assert not is_time_sensitive("Qual a capital da França?")
+
+def test_similar_questions_hit_by_embedding():
+    cache = AnswerCache(similarity=0.9)
+    cache.put("Qual a capital da França?", "Paris", ttl=60, vector=[1.0, 0.0, 0.1])
+    assert cache.get("capital da frança", vector=[0.9, 0.0, 0.1]) == "Paris"
+    assert cache.get("receita de bolo", vector=[0.0, 1.0, 0.0]) is None
+    assert cache.similar_hits == 1
+
+def test_similarity_requires_same_numbers_and_short_names():
+    cache = AnswerCache(similarity=0.9)
+    cache.put("clima em SP hoje", "25 graus", ttl=60, vector=[1.0, 0.0])
+    cache.put("Oscar 2024 melhor filme", "Oppenheimer", ttl=60, vector=[0.0, 1.0])
+    assert cache.get("clima em RJ hoje", vector=[1.0, 0.0]) is None
+    assert cache.get("Oscar 2023 melhor filme", vector=[0.0, 1.0]) is None
+    assert cache.get("como está o clima em SP hoje", vector=[1.0, 0.01]) == "25 graus"
+
+def test_evicted_rows_are_reused():
+    cache = AnswerCache(max_entries=2, similarity=0.9)
+    cache.put("alpha", "1", ttl=60, vector=[1.0, 0.0])
+    cache.put("beta", "2", ttl=60, vector=[0.0, 1.0])
+    cache.put("gamma", "3", ttl=60, vector=[1.0, 1.0])
+    assert cache.get("alpha") is None and len(cache) == 2
+    assert len(cache._row_keys) == 2
+    assert cache.get("delta", vector=[1.0, 0.9]) == "3"
+
+def make_bot(cache):
+    bot = MagicMock()
+    bot.embed = AsyncMock(return_value=None)
+    bot.answer_ttl = 3600
+    bot.volatile_answer_ttl = 0
+    return bot
+
+@pytest.mark.asyncio
+async def test_run_flow_hit_skips_the_flow(mocker):
+    cache = AnswerCache()
+    cache.put("capital da França", "Paris", ttl=60)
+    build_flow = mocker.patch('aiquery.build_flow')
+    tokens = TokenStream()
+    shared = {'bot': make_bot(cache), 'user_query': "Capital da França?", 'answer_cache': cache, 'tokens': tokens}
+
+    assert await run_flow(shared) == "cached"
+    build_flow.assert_not_called()
+    assert shared['answer'] == "Paris" and shared['cached_answer']
+    tokens.close()
+    assert [event async for event in tokens] == [('start', ''), ('token', "Paris")]
+
+@pytest.mark.asyncio
+async def test_exact_hit_skips_the_embedding(mocker):
+    cache = AnswerCache()
+    flow = mocker.patch('aiquery.build_flow').return_value
+    async def run_async(shared):
+        shared['answer'] = "Paris"
+    flow.run_async = run_async
+    bot = make_bot(cache)
+    bot.embed = AsyncMock(return_value=[1.0, 0.0])
+
+    await run_flow({'bot': bot, 'user_query': "Capital da França?", 'answer_cache': cache})
+    assert bot.embed.await_count == 1
+    # The vector of the miss was stored with the answer
+    assert cache._entries["capital da franca"][3] is not None
+    shared = {'bot': bot, 'user_query': "capital da frança", 'answer_cache': cache}
+    assert await run_flow(shared) == "cached"
+    assert bot.embed.await_count == 1
+    assert cache.stats()['misses'] == 1
+
+@pytest.mark.asyncio
+async def test_run_flow_miss_runs_and_caches(mocker):
+    cache = AnswerCache()
+    flow = MagicMock()
+    async def run_async(shared):
+        shared['answer'] = "Paris"
+    flow.run_async = run_async
+    mocker.patch('aiquery.build_flow', return_value=flow)
+    bot = make_bot(cache)
+
+    await run_flow({'bot': bot, 'user_query': "capital da França", 'answer_cache': cache})
+    await run_flow({'bot': bot, 'user_query': "clima em SP", 'answer_cache': cache})
+
+    assert cache.get("capital da frança") == "Paris"
+    # Weather answers use the volatile TTL, 0 here
+    assert cache.get("clima em SP") is None
+
+@pytest.mark.asyncio
+async def test_failed_answers_are_not_cached(mocker):
+    cache = AnswerCache()
+    flow = MagicMock()
+    async def run_async(shared):
+        shared['answer'] = "Could not generate an answer due to an error: boom"
+        shared['answer_failed'] = True
+    flow.run_async = run_async
+    mocker.patch('aiquery.build_flow', return_value=flow)
+
+    await run_flow({'bot': make_bot(cache), 'user_query': "q", 'answer_cache': cache})
+    assert len(cache) == 0
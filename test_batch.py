@@ -0,0 +1,75 @@
+import io
+import os
+import sys
+import json
+import subprocess
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from aiquery import read_batch, run_batch
+
+def test_read_batch_plain_and_jsonl():
+    items = read_batch(["Qual a capital da França?\n", "\n", '{"id": "q2", "query": "clima em SP"}\n'])
+    assert items == [
+        {'query': "Qual a capital da França?", 'id': 0},
+        {'id': "q2", 'query': "clima em SP"},
+    ]
+
+def test_read_batch_rejects_jsonl_without_query():
+    with pytest.raises(ValueError):
+        read_batch(['{"id": 1}'])
+
+def test_read_batch_reports_bad_json_lines():
+    with pytest.raises(ValueError, match="line 2: invalid JSON"):
+        read_batch(["a", '{"query": "b",'])
+
+def test_cli_batch_errors_are_one_line(tmp_path):
+    bad = tmp_path / "bad.jsonl"
+    bad.write_text('{"query": "ok"}\n{not json}\n', encoding="utf-8")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aiquery.py")
+    for path, message in ((bad, "line 2: invalid JSON"), (tmp_path / "missing.txt", "No such file")):
+        result = subprocess.run([sys.executable, script, "--batch", str(path)], capture_output=True, text=True)
+        assert result.returncode == 1
+        assert message in result.stderr and "Traceback" not in result.stderr
+
+def make_flow_factory(delays):
+    active = {'now': 0, 'peak': 0}
+
+    def build_flow():
+        flow = MagicMock()
+        async def run_async(shared):
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+            await asyncio.sleep(delays[shared['user_query']])
+            shared['iteration'] = 1
+            shared['answer'] = shared['user_query'].upper()
+            active['now'] -= 1
+        flow.run_async = run_async
+        return flow
+    return build_flow, active
+
+@pytest.mark.asyncio
+async def test_run_batch_preserves_order_under_concurrency(mocker):
+    delays = {"a": 0.06, "b": 0.01, "c": 0.03}
+    factory, active = make_flow_factory(delays)
+    mocker.patch('aiquery.build_flow', side_effect=factory)
+    bot = MagicMock()
+    output = io.StringIO()
+
+    await run_batch(bot, read_batch(["a", "b", "c"]), output, concurrency=2)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [r['query'] for r in results] == ["a", "b", "c"]
+    assert [r['answer'] for r in results] == ["A", "B", "C"]
+    assert all(r['iterations'] == 1 and r['elapsed'] >= 0 for r in results)
+    assert active['peak'] == 2
+
+@pytest.mark.asyncio
+async def test_run_batch_unordered_writes_as_completed(mocker):
+    factory, _ = make_flow_factory({"a": 0.05, "b": 0.0})
+    mocker.patch('aiquery.build_flow', side_effect=factory)
+    output = io.StringIO()
+
+    await run_batch(MagicMock(), read_batch(["a", "b"]), output, concurrency=2, ordered=False)
+
+    assert [json.loads(line)['query'] for line in output.getvalue().splitlines()] == ["b", "a"]
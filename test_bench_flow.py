@@ -0,0 +1,41 @@
+import pytest
+from ollama import AsyncClient
+from bench_flow import FakeOllamaServer, RecordedSearchBackend, percentile, run_benchmark, format_report
+
+@pytest.mark.asyncio
+async def test_fake_server_streams_and_answers():
+    server = await FakeOllamaServer(latency=0, tokens_per_sec=1000, answer_tokens=5).start()
+    try:
+        client = AsyncClient(host=server.url)
+        check = await client.generate(model="m", prompt="You are a strict relevance checker.")
+        assert check["response"] == "YES"
+        chunks = [c async for c in await client.generate(model="m", prompt="Answer this", stream=True)]
+        assert "".join(c["response"] for c in chunks).split() == [f"palavra{i}" for i in range(5)]
+        assert chunks[-1]["done"] and chunks[-1]["eval_count"] == 5
+        assert server.calls_by_kind == {"relevance": 1, "answer": 1}
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_recorded_backend_matches_normalized_query():
+    backend = RecordedSearchBackend(latency=0)
+    results = await backend.search("  CAPITAL da frança ")
+    assert results[0]["href"] == "https://pt.wikipedia.org/wiki/Paris"
+    assert await backend.search("unknown query", max_results=1) == backend.default[:1]
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+
+@pytest.mark.asyncio
+async def test_benchmark_runs_flows_end_to_end():
+    rows = await run_benchmark(levels=(1, 2), requests=2, latency=0, tokens_per_sec=2000, search_latency=0)
+    assert [r["concurrency"] for r in rows] == [1, 2]
+    for row in rows:
+        # Query generation, relevance, answer and review for each flow
+        assert row["llm_calls"] == 8
+        assert row["searches"] == 2
+        assert row["p50"] <= row["p95"] <= row["p99"]
+    assert "p99(s)" in format_report(rows)
@@ -0,0 +1,54 @@
+import math
+import numpy as np
+from ranking import tokenize, query_terms, term_frequencies, bm25_scores, rank_snippets, WEATHER_TOKEN
+
+def test_tokenize_is_accent_insensitive():
+    assert tokenize("Previsão em SÃO PAULO") == tokenize("previsao em sao paulo") == ["previsao", "sao", "paulo"]
+    # Short words and stopwords are dropped, plurals are folded
+    assert tokenize("Os filmes que ganharam") == ["filme", "ganharam"]
+
+def test_weather_question_matches_temperature_readings():
+    assert WEATHER_TOKEN in query_terms("Como está o clima em SP?")
+    assert WEATHER_TOKEN not in query_terms("ganhador oscar 2024")
+    ranked = rank_snippets("clima Londres", [
+        "Result: Londres - cidade histórica em Londres",
+        "Result: Londres agora - 12 graus",
+    ])
+    assert "12 graus" in ranked[0]
+
+def test_rare_terms_outweigh_common_ones():
+    snippets = [
+        "Result: notícias brasil brasil brasil",
+        "Result: notícias brasil",
+        "Result: notícias Palmeiras",
+        "Result: notícias brasil hoje",
+    ]
+    ranked = rank_snippets("notícias brasil Palmeiras", snippets)
+    assert "Palmeiras" in ranked[0]
+
+def test_vectorized_scores_match_reference_formula():
+    documents = [["oscar", "filme", "oscar"], ["filme"], ["tempo", "sol", "praia", "oscar"]]
+    terms = ["oscar", "filme"]
+    tf, lengths = term_frequencies(terms, documents)
+    scores = bm25_scores(tf, lengths)
+
+    k1, b = 1.2, 0.75
+    avgdl = sum(map(len, documents)) / len(documents)
+    for doc, score in zip(documents, scores):
+        expected = 0.0
+        for term in terms:
+            n = sum(term in d for d in documents)
+            idf = math.log(1 + (len(documents) - n + 0.5) / (n + 0.5))
+            f = doc.count(term)
+            expected += idf * f * (k1 + 1) / (f + k1 * (1 - b + b * len(doc) / avgdl))
+        assert np.isclose(score, expected)
+
+def test_ties_keep_input_order():
+    assert rank_snippets("palmeiras", ["Result: A", "Result: B", "Result: C"]) == ["Result: A", "Result: B", "Result: C"]
+
+def test_near_duplicate_index_finds_close_fingerprints():
+    from ranking import NearDuplicateIndex
+    index = NearDuplicateIndex(max_distance=3)
+    index.add(0b1011 << 40)
+    assert index.contains((0b1011 << 40) ^ 0b111)       # 3 bits apart
+    assert not index.contains((0b1011 << 40) ^ 0b1111)  # 4 bits apart
@@ -7,7 +7,7 @@ from aiquery import main
 @pytest.mark.asyncio
 async def test_cli_direct_query(mocker):
     # Mock sys.argv to simulate: ./aiquery "capital france"
-    mock_args = MagicMock(timestamp=False, gui=False, query='capital france')
+    mock_args = MagicMock(timestamp=False, gui=False, serve=None, batch=None, deadline=None, trace=False, trace_file=None, warmup=False, log_file=None, log_level=None, log_format=None, query='capital france')
     mocker.patch('aiquery.argparse.ArgumentParser.parse_args', return_value=mock_args)
     mocker.patch('aiquery.SearchBotBase', return_value=MagicMock())
     
@@ -25,7 +25,7 @@ async def test_cli_direct_query(mocker):
 @pytest.mark.asyncio
 async def test_cli_gui_flag(mocker):
     # Mock sys.argv to simulate: ./aiquery --gui
-    mock_args = MagicMock(timestamp=False, gui=True, query=None)
+    mock_args = MagicMock(timestamp=False, gui=True, log_file=None, log_level=None, log_format=None, query=None)
     mocker.patch('aiquery.argparse.ArgumentParser.parse_args', return_value=mock_args)
     
     # Mock the launch_gui function in app.py
@@ -0,0 +1,116 @@
+import pytest
+import asyncio
+from aiquery import SingleFlight, TokenStream, run_flow
+
+def make_shared(question, flights, **extra):
+    shared = {'user_query': question, 'fanout': 1, 'speculative': False, 'models': {'answer': "m"},
+              'single_flight': flights, 'answer_cache': None}
+    shared.update(extra)
+    return shared
+
+class SlowRunner:
+    """Stands in for the flow: streams a few tokens, then answers."""
+    def __init__(self, delay=0.05, error=None):
+        self.calls = 0
+        self.cancelled = 0
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self, shared):
+        self.calls += 1
+        try:
+            shared['progress'](0.5, desc="Searching")
+            shared['tokens'].put('start')
+            for word in ("Paris ", "is ", "the ", "capital"):
+                shared['tokens'].put('token', word)
+                await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        shared['answer'] = "Paris is the capital"
+        shared['iteration'] = 1
+        return "pass"
+
+def collect(tokens):
+    async def read():
+        return [event async for event in tokens]
+    return asyncio.create_task(read())
+
+@pytest.mark.asyncio
+async def test_identical_questions_share_one_run():
+    flights, runner = SingleFlight(), SlowRunner()
+    first = make_shared("Qual a capital da França?", flights, tokens=TokenStream())
+    second = make_shared("qual a capital da franca", flights, tokens=TokenStream(), progress=lambda v, desc="": seen.append(desc))
+    seen = []
+    streams = [collect(first['tokens']), collect(second['tokens'])]
+
+    one = asyncio.create_task(flights.run(first, runner))
+    await asyncio.sleep(0.07)  # The second request joins mid-stream
+    results = await asyncio.gather(one, flights.run(second, runner))
+    first['tokens'].close()
+    second['tokens'].close()
+
+    assert results == ["pass", "pass"]
+    assert runner.calls == 1 and flights.started == 1 and flights.coalesced == 1
+    assert first['answer'] == second['answer'] == "Paris is the capital"
+    assert second['iteration'] == 1 and second['coalesced'] and 'coalesced' not in first
+    # The late waiter gets the whole stream and the progress it missed
+    first_events, second_events = await asyncio.gather(*streams)
+    assert first_events == second_events and len(first_events) == 5
+    assert seen == ["Searching"]
+    assert len(flights) == 0
+
+@pytest.mark.asyncio
+async def test_different_questions_or_options_run_separately():
+    flights, runner = SingleFlight(), SlowRunner(delay=0.01)
+    await asyncio.gather(
+        flights.run(make_shared("capital da França", flights), runner),
+        flights.run(make_shared("capital da Itália", flights), runner),
+        flights.run(make_shared("capital da França", flights, fanout=3), runner),
+    )
+    assert runner.calls == 3 and flights.coalesced == 0
+
+@pytest.mark.asyncio
+async def test_one_waiter_leaving_does_not_cancel_the_run():
+    flights, runner = SingleFlight(), SlowRunner()
+    leaving = asyncio.create_task(flights.run(make_shared("q", flights), runner))
+    await asyncio.sleep(0.01)
+    staying = make_shared("q", flights)
+    waiting = asyncio.create_task(flights.run(staying, runner))
+    await asyncio.sleep(0.01)
+    leaving.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leaving
+    assert await waiting == "pass"
+    assert staying['answer'] == "Paris is the capital" and runner.cancelled == 0
+
+@pytest.mark.asyncio
+async def test_last_waiter_leaving_cancels_the_run():
+    flights, runner = SingleFlight(), SlowRunner()
+    task = asyncio.create_task(flights.run(make_shared("q", flights), runner))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert runner.cancelled == 1 and len(flights) == 0
+    # The next request starts a new run instead of joining the cancelled one
+    assert await flights.run(make_shared("q", flights), runner) == "pass"
+    assert runner.calls == 2
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    flights, runner = SingleFlight(), SlowRunner(delay=0.01, error=RuntimeError("ollama down"))
+    results = await asyncio.gather(flights.run(make_shared("q", flights), runner),
+                                   flights.run(make_shared("q", flights), runner), return_exceptions=True)
+    assert [str(r) for r in results] == ["ollama down", "ollama down"]
+    assert runner.calls == 1
+
+@pytest.mark.asyncio
+async def test_run_flow_without_single_flight(mocker):
+    flow = mocker.patch('aiquery.build_flow')
+    flow.return_value.run_async = mocker.AsyncMock(return_value="pass")
+    assert await run_flow(make_shared("q", None)) == "pass"
+    flow.return_value.run_async.assert_awaited_once()
@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from ranking import estimate_tokens, pack_context, SnippetStore
+from aiquery import SearchBotBase, AnswerNode, QueryGenNode, parse_context_budgets, DEFAULT_CONTEXT_BUDGETS
+
+def test_estimate_tokens_counts_words_punctuation_and_long_words():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Result: Sol") == 3
+    # "temperaturas" is 12 characters, so it counts as two tokens
+    assert estimate_tokens("temperaturas") == 2
+
+def test_pack_context_keeps_whole_snippets_in_order():
+    snippets = ["Result: um dois tres", "Result: " + "longo " * 50, "Result: um dois tres", "Result: fim"]
+    packed, used = pack_context(snippets, budget=20)
+    # The long snippet does not fit and is skipped whole, the duplicate is dropped
+    assert packed == ["Result: um dois tres", "Result: fim"]
+    assert used == estimate_tokens(snippets[0]) + estimate_tokens(snippets[3]) + 2
+    assert pack_context(snippets, budget=0) == ([], 0)
+
+def test_store_ranked_lists_every_snippet():
+    store = SnippetStore("palmeiras", top_k=1, max_distance=None)
+    for snip in ["Result: Corinthians", "Result: Palmeiras vence", "Result: Santos"]:
+        store.add(snip)
+    assert store.ranked() == ["Result: Palmeiras vence", "Result: Corinthians", "Result: Santos"]
+    assert store.top() == ["Result: Palmeiras vence"]
+
+def test_budgets_per_model_override_generic_ones(monkeypatch):
+    assert parse_context_budgets("answer=900, qwen2.5:14b/answer=3000,") == {
+        (None, 'answer'): 900, ('qwen2.5:14b', 'answer'): 3000
+    }
+    monkeypatch.setenv("AIQUERY_CONTEXT_BUDGETS", "answer=900,qwen2.5:14b/answer=3000,qwen2.5:14b/querygen=512")
+    bot = SearchBotBase()
+    assert bot.context_budgets_for("llama3.2:1B") == {**DEFAULT_CONTEXT_BUDGETS, 'answer': 900}
+    assert bot.context_budgets_for("qwen2.5:14b") == {**DEFAULT_CONTEXT_BUDGETS, 'answer': 3000, 'querygen': 512}
+
+@pytest.mark.asyncio
+async def test_answer_prompt_packs_ranked_snippets_within_budget():
+    bot = MagicMock()
+    bot.client.generate = AsyncMock(side_effect=Exception("stop"))
+    store = SnippetStore("palmeiras", max_distance=None)
+    for i in range(40):
+        store.add(f"Result: Notícia {i} sobre futebol brasileiro")
+    store.add("Result: Palmeiras vence o clássico")
+    shared = {'bot': bot, 'user_query': "palmeiras", 'snippets': store, 'context_budgets': {'answer': 30}}
+
+    await AnswerNode().exec_async(shared)
+
+    prompt = bot.client.generate.call_args.kwargs['prompt']
+    results = prompt.split("SEARCH RESULTS:\n", 1)[1].split("\n\n", 1)[0].splitlines()
+    assert results[0] == "Result: Palmeiras vence o clássico"
+    assert all(line in store.history for line in results)
+    assert sum(estimate_tokens(line) + 1 for line in results) <= 30
+
+@pytest.mark.asyncio
+async def test_querygen_falls_back_to_history_list():
+    bot = MagicMock()
+    bot.client.generate = AsyncMock(return_value={'response': "q"})
+    shared = {'bot': bot, 'user_query': "x", 'history': ["Result: a", "Result: a", "Result: b"]}
+
+    await QueryGenNode().exec_async(shared)
+
+    prompt = bot.client.generate.call_args.kwargs['prompt']
+    assert "FOUND SO FAR:\nResult: a\nResult: b\n" in prompt
@@ -0,0 +1,165 @@
+import time
+import pytest
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+from aiquery import (QueryGenNode, RelevanceNode, AnswerNode, ReviewNode, SearchBotBase, new_shared,
+                     run_until_deadline, answer_question, time_left, parse_deadline, MIN_ANSWER_TOKENS)
+from caching import AnswerCache
+from ranking import SnippetStore
+from telemetry import LatencyModel
+
+async def fake_stream(*chunks):
+    for chunk in chunks:
+        yield {'response': chunk}
+    yield {'response': "", 'done': True, 'done_reason': "length", 'eval_count': 40, 'eval_duration': 2e9}
+
+def make_shared(seconds_left, reply="NO"):
+    bot = MagicMock(today="2026-10-17")
+    bot.client.generate = AsyncMock(return_value={'response': reply})
+    shared = {
+        'bot': bot, 'user_query': "ganhador oscar 2024", 'iteration': 1, 'latency': LatencyModel(),
+        'context': "Result: Oscar - cerimônia", 'answer': "Oppenheimer",
+    }
+    if seconds_left is not None:
+        shared['deadline'] = seconds_left
+        shared['deadline_at'] = time.monotonic() + seconds_left
+    return shared
+
+def test_latency_model_learns_node_times_and_speed():
+    latency = LatencyModel(alpha=0.5)
+    assert latency.node_seconds('search') == LatencyModel.DEFAULT_NODE_SECONDS['search']
+    latency.observe_node('search', 4.0)
+    latency.observe_node('search', 1.0)
+    assert latency.node_seconds('search') == pytest.approx(2.0)  # 2 -> 3 -> 2
+    assert latency.node_seconds('search', 'answer') == pytest.approx(latency.node_seconds('search') + 15.0)
+    assert latency.tokens_per_sec("m") == LatencyModel.DEFAULT_TOKENS_PER_SEC
+    latency.observe_llm("m", {'eval_count': 100, 'eval_duration': 2e9})
+    latency.observe_llm("m", {'eval_count': 1, 'eval_duration': 1e9, 'cached': True})
+    assert latency.tokens_per_sec("m") == 50.0
+
+def test_deadline_must_be_finite():
+    assert parse_deadline("2.5") == 2.5 and parse_deadline(0) == 0
+    for value in ("inf", "nan", "1e309", "-1", float("inf")):
+        with pytest.raises(ValueError):
+            parse_deadline(value)
+
+def test_deadline_counts_from_new_shared(monkeypatch):
+    monkeypatch.setenv("AIQUERY_DEADLINE", "30")
+    bot = SearchBotBase()
+    assert bot.deadline == 30.0
+    assert 29 < time_left(new_shared(bot, "q")) <= 30
+    assert 'deadline_at' not in new_shared(bot, "q", deadline=None)
+    assert time_left(new_shared(bot, "q", deadline=None)) is None
+
+@pytest.mark.asyncio
+async def test_nodes_run_normally_with_time_to_spare():
+    shared = make_shared(600)
+    assert await RelevanceNode().exec_async(shared) == "retry"
+    shared['bot'].client.generate = AsyncMock(return_value={'response': "3"})
+    assert await ReviewNode().exec_async(shared) == "fail"
+    assert 'deadline_cuts' not in shared
+
+@pytest.mark.asyncio
+async def test_short_deadline_skips_optional_steps():
+    shared = make_shared(10)  # Less than relevance + answer (3 + 15s by default)
+    assert await RelevanceNode().exec_async(shared) == "success"
+    assert await ReviewNode().exec_async(shared) == "pass"
+    assert await QueryGenNode().exec_async(shared) == "default"
+    assert shared['search_queries'] == ["ganhador oscar 2024"]
+    shared['bot'].client.generate.assert_not_called()
+    assert len(shared['deadline_cuts']) == 3
+
+@pytest.mark.asyncio
+async def test_no_retry_when_another_attempt_does_not_fit():
+    shared = make_shared(20)  # Enough to check relevance, not to search again
+    assert await RelevanceNode().exec_async(shared) == "success"
+    shared['bot'].client.generate.assert_awaited_once()
+    assert shared['deadline_cuts'] == ["answering with the results found so far"]
+
+@pytest.mark.asyncio
+async def test_answer_length_fits_the_time_left(capsys):
+    shared = make_shared(11)
+    shared['latency'].observe_llm("m", {'eval_count': 200, 'eval_duration': 10e9})
+    shared['models'] = {'answer': "m"}
+    shared['bot'].client.generate = AsyncMock(return_value=fake_stream("Oppen", "heimer"))
+    await AnswerNode().exec_async(shared)
+    limit = shared['bot'].client.generate.call_args.kwargs['options']['num_predict']
+    assert 190 <= limit <= 200  # ~10s of writing at 20 tokens/s
+    assert shared['answer'] == "Oppenheimer" and 'answer_draft' not in shared
+    assert shared['deadline_cuts'] == ["answer shortened"]
+
+    shared = make_shared(0.1)
+    shared['bot'].client.generate = AsyncMock(return_value=fake_stream("x"))
+    await AnswerNode().exec_async(shared)
+    assert shared['bot'].client.generate.call_args.kwargs['options']['num_predict'] == MIN_ANSWER_TOKENS
+
+    shared = make_shared(None)
+    shared['bot'].client.generate = AsyncMock(return_value=fake_stream("x"))
+    await AnswerNode().exec_async(shared)
+    assert 'options' not in shared['bot'].client.generate.call_args.kwargs
+
+def stalled_flow(mocker, before):
+    async def run_async(shared):
+        before(shared)
+        await asyncio.sleep(60)
+    flow = mocker.patch('aiquery.build_flow')
+    flow.return_value.run_async = run_async
+
+@pytest.mark.asyncio
+async def test_deadline_returns_the_best_answer_so_far(mocker, capsys):
+    # The last complete answer wins over the one being written
+    stalled_flow(mocker, lambda shared: shared.update(answer="complete", answer_draft=["par"]))
+    shared = make_shared(0.05)
+    del shared['answer']
+    assert await run_until_deadline(shared) == "deadline"
+    assert shared['answer'] == "complete"
+    assert shared['deadline_cuts'] == ["stopped at the deadline"]
+
+    stalled_flow(mocker, lambda shared: shared.update(answer_draft=["Oppen", "heimer"]))
+    shared = make_shared(0.05)
+    del shared['answer']
+    await run_until_deadline(shared)
+    assert shared['answer'] == "Oppenheimer"
+
+    store = SnippetStore("oscar 2024")
+    store.ingest(["Result: Oscar 2024 - Oppenheimer"], "oscar 2024")
+    stalled_flow(mocker, lambda shared: shared.update(snippets=store))
+    shared = make_shared(0.05)
+    del shared['answer']
+    await run_until_deadline(shared)
+    assert "Oppenheimer" in shared['answer'] and shared['answer_failed']
+
+@pytest.mark.asyncio
+async def test_answers_cut_by_the_deadline_are_not_cached(mocker):
+    flow = mocker.patch('aiquery.build_flow')
+    async def run_async(shared):
+        shared['answer'] = "short"
+        shared['deadline_cuts'] = ["skipping the answer review"]
+    flow.return_value.run_async = run_async
+    shared = make_shared(60)
+    shared['bot'].embed = AsyncMock(return_value=None)
+    shared['answer_cache'] = AnswerCache()
+    await answer_question(shared)
+    assert len(shared['answer_cache']) == 0
+
+async def slow_stream(*chunks):
+    for chunk in chunks:
+        yield {'response': chunk}
+    await asyncio.sleep(60)
+
+@pytest.mark.asyncio
+async def test_discarded_speculative_answer_leaves_no_draft(capsys):
+    for confirmed in (False, True):
+        shared = make_shared(600)
+        del shared['answer']
+        shared['speculation_gate'] = gate = asyncio.Event()
+        if confirmed:
+            gate.set()
+        shared['bot'].client.generate = AsyncMock(return_value=slow_stream("Oppen", "heimer"))
+        task = asyncio.create_task(AnswerNode().exec_async(shared))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Only an answer the flow committed to is worth returning at the deadline
+        assert (shared.get('answer_draft') == ["Oppen", "heimer"]) is confirmed
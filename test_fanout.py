@@ -0,0 +1,52 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from aiquery import QueryGenNode, SearchNode, SearchBackend, SearchBotBase, new_shared, parse_queries
+
+def test_parse_queries_strips_markers_and_duplicates():
+    text = '1. clima Londres hoje\n2) "clima Paris hoje"\n- clima londres hoje\n\n* previsão Europa'
+    assert parse_queries(text, 3) == ["clima Londres hoje", "clima Paris hoje", "previsão Europa"]
+
+@pytest.mark.asyncio
+async def test_query_gen_fanout(mocker):
+    mock_bot = MagicMock()
+    mock_bot.client.generate = mocker.AsyncMock(return_value={"response": "clima Londres\nclima Paris"})
+    shared = {"bot": mock_bot, "user_query": "Compare o clima de Londres e Paris", "iteration": 0, "fanout": 2}
+
+    await QueryGenNode().exec_async(shared)
+    assert shared["search_queries"] == ["clima Londres", "clima Paris"]
+    assert shared["search_query"] == "clima Londres"
+    assert "2 concise" in mock_bot.client.generate.call_args.kwargs["prompt"]
+
+@pytest.mark.asyncio
+async def test_search_node_fanout_runs_concurrently_and_merges():
+    class SlowBackend(SearchBackend):
+        def __init__(self):
+            self.active = 0
+            self.peak = 0
+        async def search(self, query, region='br-pt', max_results=10):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.05)
+            self.active -= 1
+            shared_page = {"title": "Europa", "body": "Clima na Europa", "href": "http://europa"}
+            return [{"title": query, "body": f"Tempo em {query}", "href": f"http://{query}"}, shared_page]
+
+    backend = SlowBackend()
+    bot = MagicMock()
+    bot.search_backend = backend
+    shared = {
+        'bot': bot, 'user_query': "Compare Londres e Paris", 'history': [],
+        'search_queries': ["Londres", "Paris", "Roma"], 'search_concurrency': 2
+    }
+
+    await SearchNode().exec_async(shared)
+    assert backend.peak == 2
+    assert len(shared['history']) == 4
+    assert sum("Europa" in snip for snip in shared['history']) == 1
+
+def test_search_concurrency_comes_from_env(monkeypatch):
+    monkeypatch.setenv("AIQUERY_SEARCH_CONCURRENCY", "5")
+    assert new_shared(SearchBotBase(), "q")['search_concurrency'] == 5
+    monkeypatch.setenv("AIQUERY_SEARCH_CONCURRENCY", "0")
+    assert new_shared(SearchBotBase(), "q")['search_concurrency'] == 1
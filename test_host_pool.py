@@ -0,0 +1,122 @@
+import socket
+import pytest
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+from ollama import AsyncClient
+from aiquery import OllamaHostPool, SearchBotBase, parse_hosts
+from bench_flow import FakeOllamaServer
+
+def dead_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+async def start_servers(n, **kwargs):
+    return [await FakeOllamaServer(tokens_per_sec=1000, **kwargs).start() for _ in range(n)]
+
+def test_parse_hosts():
+    assert parse_hosts("http://a:11434, http://b:11434\nhttp://c:11434") == [
+        "http://a:11434", "http://b:11434", "http://c:11434"
+    ]
+    assert parse_hosts("") == []
+
+@pytest.mark.asyncio
+async def test_calls_go_to_least_loaded_host():
+    servers = await start_servers(2, latency=0.05)
+    try:
+        pool = OllamaHostPool({s.url: AsyncClient(host=s.url) for s in servers})
+        await asyncio.gather(*(pool.generate(model="m", prompt="Answer") for _ in range(6)))
+        assert [s.calls for s in servers] == [3, 3]
+        assert all(stats['outstanding'] == 0 and stats['requests'] == 3 for stats in pool.stats().values())
+    finally:
+        for s in servers:
+            await s.stop()
+
+@pytest.mark.asyncio
+async def test_unreachable_host_is_retried_and_ejected():
+    (server,) = await start_servers(1, latency=0)
+    dead = dead_url()
+    try:
+        pool = OllamaHostPool({dead: AsyncClient(host=dead), server.url: AsyncClient(host=server.url)},
+                              max_failures=2, eject_seconds=60)
+        for _ in range(4):
+            response = await pool.generate(model="m", prompt="You are a strict relevance checker.")
+            assert response['response'] == "YES"
+        stats = pool.stats()
+        assert stats[dead]['failures'] == 2 and stats[dead]['ejections'] == 1
+        assert stats[dead]['healthy'] is False
+        assert server.calls == 4
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_stream_retries_before_first_chunk():
+    (server,) = await start_servers(1, latency=0, answer_tokens=3)
+    dead = dead_url()
+    try:
+        pool = OllamaHostPool({dead: AsyncClient(host=dead), server.url: AsyncClient(host=server.url)})
+        chunks = [c async for c in await pool.generate(model="m", prompt="Answer", stream=True)]
+        assert "".join(c['response'] for c in chunks).split() == ["palavra0", "palavra1", "palavra2"]
+        assert pool.stats()[dead]['failures'] == 1
+        assert all(stats['outstanding'] == 0 for stats in pool.stats().values())
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_stream_cancelled_before_first_chunk_is_released():
+    (server,) = await start_servers(1, latency=5)
+    try:
+        pool = OllamaHostPool({server.url: AsyncClient(host=server.url)})
+
+        async def consume():
+            return [c async for c in await pool.generate(model="m", prompt="Answer", stream=True)]
+        task = asyncio.create_task(consume())
+        while server.calls == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        stats = pool.stats()[server.url]
+        assert stats['outstanding'] == 0 and stats['failures'] == 0
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_request_errors_are_not_retried():
+    clients = {"a": MagicMock(), "b": MagicMock()}
+    for client in clients.values():
+        client.generate = AsyncMock(side_effect=ValueError("bad request"))
+    pool = OllamaHostPool(clients)
+    with pytest.raises(ValueError):
+        await pool.generate(model="m", prompt="p")
+    assert sum(c.generate.await_count for c in clients.values()) == 1
+    assert all(stats['failures'] == 0 for stats in pool.stats().values())
+
+@pytest.mark.asyncio
+async def test_all_hosts_down_raises():
+    urls = [dead_url(), dead_url()]
+    pool = OllamaHostPool({u: AsyncClient(host=u) for u in urls})
+    with pytest.raises(ConnectionError):
+        await pool.generate(model="m", prompt="p")
+
+def test_bot_pools_several_hosts(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", "http://a:11434,http://b:11434")
+    monkeypatch.setenv("OLLAMA_NUM_PARALLEL", "2")
+    bot = SearchBotBase()
+    assert isinstance(bot.client.client, OllamaHostPool)
+    assert bot.host == "http://a:11434"
+    assert bot.client.max_parallel == 4
+    assert bot.metrics()['aiquery_ollama_host_outstanding{host="http://b:11434"}'] == 0
+
+@pytest.mark.asyncio
+async def test_warm_up_loads_every_host():
+    servers = await start_servers(2, latency=0)
+    dead = dead_url()
+    try:
+        clients = {s.url: AsyncClient(host=s.url) for s in servers}
+        clients[dead] = AsyncClient(host=dead)
+        await OllamaHostPool(clients).warm_up("m", keep_alive="10m")
+        assert [s.calls for s in servers] == [1, 1]
+    finally:
+        for s in servers:
+            await s.stop()
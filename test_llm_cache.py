@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+from caching import LLMCache
+from aiquery import OllamaClient, QueryGenNode
+
+def make_client(**kwargs):
+    inner = MagicMock()
+    inner.generate = AsyncMock(return_value={"response": "YES"})
+    return inner, OllamaClient(inner, **kwargs)
+
+@pytest.mark.asyncio
+async def test_repeated_prompt_served_from_cache():
+    inner, client = make_client(cache=LLMCache(), cache_nodes=["relevance"])
+    first = await client.generate(model="m", prompt="p", node="relevance")
+    second = await client.generate(model="m", prompt="p", node="relevance")
+    assert first["response"] == second["response"] == "YES"
+    assert inner.generate.await_count == 1
+    assert client.cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_cache_key_includes_model_and_options():
+    inner, client = make_client(cache=LLMCache(), cache_nodes=["review"])
+    await client.generate(model="a", prompt="p", node="review")
+    await client.generate(model="b", prompt="p", node="review")
+    await client.generate(model="a", prompt="p", node="review", options={"temperature": 0})
+    assert inner.generate.await_count == 3
+
+@pytest.mark.asyncio
+async def test_disabled_nodes_and_streams_bypass_cache():
+    inner, client = make_client(cache=LLMCache(), cache_nodes=["relevance"])
+    await client.generate(model="m", prompt="p", node="querygen")
+    await client.generate(model="m", prompt="p", node="querygen")
+    await client.generate(model="m", prompt="p", node="relevance", stream=True)
+    await client.generate(model="m", prompt="p", node="relevance", stream=True)
+    assert inner.generate.await_count == 4
+
+@pytest.mark.asyncio
+async def test_query_retry_with_unchanged_prompt_asks_the_model_again(capsys):
+    inner, client = make_client(cache=LLMCache(), cache_nodes=["querygen"])
+    bot = MagicMock(model="m", client=client)
+    shared = {'bot': bot, 'user_query': "q", 'iteration': 1, 'feedback': "more"}
+    await QueryGenNode().exec_async(shared)
+    # Attempt 3 sees the same question, findings and feedback as attempt 2
+    shared['iteration'] = 1
+    await QueryGenNode().exec_async(shared)
+    assert inner.generate.await_count == 2
+    assert client.cache.stats()["hits"] == 0
+
+def test_llm_cache_lru_and_ttl():
+    cache = LLMCache(max_entries=2, ttl=60)
+    with patch('caching.time.time', return_value=0.0):
+        cache.put("a", {"response": "1"})
+        cache.put("b", {"response": "2"})
+        cache.get("a")
+        cache.put("c", {"response": "3"})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"response": "1"}
+    with patch('caching.time.time', return_value=61.0):
+        assert cache.get("a") is None
+
+def test_llm_cache_disk_persistence(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    LLMCache(path=path).put("k", {"response": "Paris"})
+    assert LLMCache(path=path).get("k") == {"response": "Paris"}
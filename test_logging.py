@@ -0,0 +1,73 @@
+import json
+import logging
+import pytest
+from logging.handlers import QueueHandler
+from unittest.mock import MagicMock, AsyncMock
+from aiquery import QueryGenNode, new_shared
+from telemetry import setup_logging, LOG_CONTEXT
+
+@pytest.fixture
+def log_setup():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    listeners = []
+
+    def setup(**kwargs):
+        listener = setup_logging(**kwargs)
+        listeners.append(listener)
+        return listener
+
+    yield setup
+    for listener in listeners:
+        listener.stop()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+def read_json_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_records_go_through_a_queue(log_setup, tmp_path):
+    listener = log_setup(path=str(tmp_path / "a.log"))
+    new = [h for h in logging.getLogger().handlers if h not in listener.handlers]
+    assert any(isinstance(h, QueueHandler) for h in new)
+    logging.getLogger("AiQuery").info("hello %s", "world")
+    listener.stop()
+    assert "AiQuery - INFO - hello world" in (tmp_path / "a.log").read_text()
+
+@pytest.mark.asyncio
+async def test_json_lines_carry_flow_fields(log_setup, tmp_path):
+    path = tmp_path / "a.jsonl"
+    listener = log_setup(path=str(path), fmt="json")
+    bot = MagicMock()
+    bot.model = "m"
+    bot.client.generate = AsyncMock(return_value={'response': "capital frança"})
+    shared = {'bot': bot, 'user_query': "q", 'iteration': 0, 'query_id': "abc123"}
+
+    await QueryGenNode()._run_async(shared)
+    listener.stop()
+
+    records = read_json_lines(path)
+    formulating = next(r for r in records if "Formulating query" in r['message'])
+    assert formulating['query_id'] == "abc123" and formulating['node'] == "querygen"
+    assert formulating['iteration'] == 1
+    finished = next(r for r in records if r['message'].startswith("Node querygen finished"))
+    assert finished['duration'] >= 0 and finished['level'] == "INFO"
+    # The node context does not leak past the node run
+    assert LOG_CONTEXT.get().get('node') is None
+
+def test_new_shared_sets_query_id(log_setup, tmp_path):
+    path = tmp_path / "a.jsonl"
+    listener = log_setup(path=str(path), fmt="json")
+    shared = new_shared(MagicMock(), "q")
+    logging.getLogger("AiQuery").info("run started")
+    listener.stop()
+    assert read_json_lines(path)[-1]['query_id'] == shared['query_id']
+
+def test_size_rotation(log_setup, tmp_path):
+    path = tmp_path / "a.log"
+    listener = log_setup(path=str(path), max_bytes=200, backups=2)
+    for i in range(20):
+        logging.getLogger("AiQuery").info("line %d", i)
+    listener.stop()
+    assert (tmp_path / "a.log.1").exists() and (tmp_path / "a.log.2").exists()
+    assert not (tmp_path / "a.log.3").exists()
@@ -1,7 +1,7 @@
 import pytest
 import asyncio
 from unittest.mock import MagicMock
-from aiquery import QueryGenNode, SearchNode, RelevanceNode, AnswerNode
+from aiquery import QueryGenNode, SearchNode, RelevanceNode, AnswerNode, DDGSBackend
 
 @pytest.mark.asyncio
 async def test_memory_accumulation_loop():
@@ -27,9 +27,10 @@ async def test_memory_accumulation_loop():
         
     mock_bot.rank_context.side_effect = mock_rank
 
-    # We need to mock DDGS in SearchNode
+    # We need to mock DDGS behind the search backend used by SearchNode
     with patch('aiquery.DDGS') as mock_ddgs:
-        instance = mock_ddgs.return_value.__enter__.return_value
+        mock_bot.search_backend = DDGSBackend(max_workers=1)
+        instance = mock_ddgs.return_value
         # First call to DDGS().text returns Result A
         # Second call returns Result B
         instance.text.side_effect = [
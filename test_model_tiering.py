@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from aiquery import SearchBotBase, QueryGenNode, RelevanceNode, ReviewNode, new_shared, describe_models
+from telemetry import Trace
+
+@pytest.fixture
+def tiered_env(monkeypatch):
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3.2:3b")
+    monkeypatch.setenv("OLLAMA_MODEL_QUERYGEN", "qwen2.5:0.5b")
+    monkeypatch.setenv("OLLAMA_MODEL_RELEVANCE", "qwen2.5:0.5b")
+    monkeypatch.delenv("OLLAMA_MODEL_REVIEW", raising=False)
+    monkeypatch.setenv("OLLAMA_MODEL_ANSWER", "qwen2.5:7b")
+
+def test_node_models_fall_back_to_default(tiered_env):
+    bot = SearchBotBase()
+    assert bot.models == {
+        'querygen': "qwen2.5:0.5b", 'relevance': "qwen2.5:0.5b",
+        'answer': "qwen2.5:7b", 'review': "llama3.2:3b",
+    }
+    assert bot.model_for('review') == "llama3.2:3b"
+    assert bot.model_for('search') == "llama3.2:3b"
+
+def test_context_budgets_follow_node_models(tiered_env, monkeypatch):
+    monkeypatch.setenv("AIQUERY_CONTEXT_BUDGETS", "qwen2.5:7b/answer=3000,qwen2.5:0.5b/relevance=512")
+    shared = new_shared(SearchBotBase(), "q")
+    assert shared['models']['answer'] == "qwen2.5:7b"
+    assert shared['context_budgets'] == {'querygen': 256, 'relevance': 512, 'answer': 3000}
+
+@pytest.mark.asyncio
+async def test_nodes_call_and_trace_their_own_model():
+    bot = MagicMock()
+    bot.model = "default"
+    bot.client.generate = AsyncMock(return_value={'response': "YES 8"})
+    trace = Trace("q")
+    shared = {
+        'bot': bot, 'user_query': "q", 'iteration': 0, 'answer': "a", 'trace': trace,
+        'models': {'querygen': "tiny", 'relevance': "tiny"},
+    }
+
+    await QueryGenNode()._run_async(shared)
+    await RelevanceNode()._run_async(shared)
+    await ReviewNode()._run_async(shared)
+
+    assert [c.kwargs['model'] for c in bot.client.generate.call_args_list] == ["tiny", "tiny", "default"]
+    assert [(c['node'], c['model']) for c in trace.llm_calls] == [
+        ("querygen", "tiny"), ("relevance", "tiny"), ("review", "default")
+    ]
+
+@pytest.mark.asyncio
+async def test_warm_up_loads_each_model_once(tiered_env):
+    bot = SearchBotBase()
+    bot.client = MagicMock()
+    bot.client.warm_up = AsyncMock(return_value={'load_duration': 0})
+    assert await bot.warm_up() is True
+    assert sorted(c.args[0] for c in bot.client.warm_up.call_args_list) == ["llama3.2:3b", "qwen2.5:0.5b", "qwen2.5:7b"]
+
+def test_describe_models_groups_nodes():
+    assert describe_models({'querygen': "a", 'relevance': "a", 'answer': "b", 'review': "a"}) == \
+        "a (querygen, relevance, review), b (answer)"
@@ -0,0 +1,58 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from ranking import term_coverage
+from aiquery import RelevanceNode, parse_relevance_precheck
+
+def test_term_coverage_reports_missing_terms():
+    score, missing = term_coverage("Quem ganhou o Oscar de 2024?", ["Result: Oscar 2024 - Oppenheimer ganhou"])
+    assert score == 1.0 and missing == []
+    score, missing = term_coverage("Oscar 2024 Palmeiras", ["Result: Oscar 2024"])
+    assert score == pytest.approx(2 / 3) and missing == ["palmeira"]
+    assert term_coverage("o que é?", ["Result: x"]) == (None, [])
+
+def test_weather_question_is_covered_by_temperature_readings():
+    score, _ = term_coverage("clima", ["Result: Tempo - 21 graus"])
+    assert score == 1.0
+
+def make_shared(context, thresholds, iteration=1):
+    bot = MagicMock()
+    bot.client.generate = AsyncMock(return_value={'response': "NO"})
+    return {
+        'bot': bot, 'user_query': "ganhador oscar 2024", 'context': context,
+        'iteration': iteration, 'relevance_precheck': thresholds,
+    }
+
+@pytest.mark.asyncio
+async def test_full_coverage_succeeds_without_llm():
+    shared = make_shared("Result: Oscar 2024 - ganhador anunciado", (0.0, 1.0))
+    assert await RelevanceNode().exec_async(shared) == "success"
+    shared['bot'].client.generate.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_no_coverage_retries_without_llm():
+    shared = make_shared("Result: Política - eleições", (0.0, 1.0))
+    assert await RelevanceNode().exec_async(shared) == "retry"
+    assert "oscar" in shared['feedback']
+    shared['bot'].client.generate.assert_not_called()
+
+    shared = make_shared("Result: Política - eleições", (0.0, 1.0), iteration=3)
+    assert await RelevanceNode().exec_async(shared) == "success"
+
+@pytest.mark.asyncio
+async def test_uncertain_coverage_asks_llm():
+    shared = make_shared("Result: Oscar - cerimônia", (0.0, 1.0))
+    assert await RelevanceNode().exec_async(shared) == "retry"
+    shared['bot'].client.generate.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_precheck_is_off_by_default():
+    shared = make_shared("Result: Oscar 2024 - ganhador anunciado", None)
+    assert await RelevanceNode().exec_async(shared) == "retry"
+    shared['bot'].client.generate.assert_awaited_once()
+
+def test_precheck_thresholds_are_validated(capsys):
+    assert parse_relevance_precheck("") is None
+    assert parse_relevance_precheck(" 0.2, 0.8 ") == (0.2, 0.8)
+    for spec in ("0.3", "0.2,0.5,0.8", "0.8,0.2", "0,1.5", "low,high"):
+        assert parse_relevance_precheck(spec) is None
+    assert "Ignoring AIQUERY_RELEVANCE_PRECHECK" in capsys.readouterr().out
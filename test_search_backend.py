@@ -0,0 +1,60 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+from aiquery import DDGSBackend, SearchBackend, SearchNode
+
+@pytest.mark.asyncio
+async def test_ddgs_backend_does_not_block_loop():
+    with patch('aiquery.DDGS') as mock_ddgs:
+        def slow_text(query, **kwargs):
+            time.sleep(0.3)
+            return [{"title": query, "body": "Body"}]
+        mock_ddgs.return_value.text.side_effect = slow_text
+        backend = DDGSBackend(max_workers=2)
+
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        results, _ = await asyncio.gather(backend.search("q"), ticker())
+        assert results[0]["title"] == "q"
+        # The loop kept running while the search was in flight
+        assert ticks == 5
+
+@pytest.mark.asyncio
+async def test_ddgs_backend_reuses_session():
+    with patch('aiquery.DDGS') as mock_ddgs:
+        mock_ddgs.return_value.text.return_value = [{"title": "T", "body": "B"}]
+        backend = DDGSBackend()
+        await backend.search("a")
+        await backend.search("b")
+        assert mock_ddgs.call_count == 1
+        assert mock_ddgs.return_value.text.call_count == 2
+
+@pytest.mark.asyncio
+async def test_ddgs_backend_timeout():
+    with patch('aiquery.DDGS') as mock_ddgs, patch('aiquery.SEARCH_TIMEOUT_GRACE', 0.0):
+        mock_ddgs.return_value.text.side_effect = lambda *a, **k: time.sleep(0.5) or []
+        backend = DDGSBackend(timeout=0.05)
+        with pytest.raises(TimeoutError):
+            await backend.search("slow")
+        # The HTTP client enforces the same timeout on its own requests
+        mock_ddgs.assert_called_once_with(timeout=0.05)
+
+@pytest.mark.asyncio
+async def test_search_node_awaits_backend():
+    class StaticBackend(SearchBackend):
+        async def search(self, query, region='br-pt', max_results=10):
+            return [{"title": "Capital", "body": "Paris é a capital da França"}]
+
+    bot = MagicMock()
+    bot.search_backend = StaticBackend()
+    shared = {'bot': bot, 'user_query': "capital França", 'search_query': "capital França", 'history': []}
+
+    await SearchNode().exec_async(shared)
+    assert shared['history'] == ["Result: Capital - Paris é a capital da França"]
+    assert "Paris" in shared['context']
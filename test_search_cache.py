@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import patch
+from caching import SearchCache
+from aiquery import CachedSearchBackend, SearchBackend
+
+class CountingBackend(SearchBackend):
+    def __init__(self):
+        self.calls = 0
+    async def search(self, query, region='br-pt', max_results=10):
+        self.calls += 1
+        return [{"title": "Paris", "body": f"Resultado {self.calls}"}]
+
+def test_search_cache_normalizes_key(tmp_path):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"))
+    cache.put("Capital  da França", "br-pt", 10, [{"title": "T", "body": "B"}])
+    assert cache.get(" capital da frança ", "br-pt", 10) == [{"title": "T", "body": "B"}]
+    # Region and result count are part of the key
+    assert cache.get("capital da frança", "us-en", 10) is None
+    assert cache.get("capital da frança", "br-pt", 5) is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'entries': 1}
+
+def test_search_cache_ttl_expiry(tmp_path):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=60)
+    with patch('caching.time.time', return_value=1000.0):
+        cache.put("q", "br-pt", 10, [{"title": "T"}])
+    with patch('caching.time.time', return_value=1059.0):
+        assert cache.get("q", "br-pt", 10) is not None
+    with patch('caching.time.time', return_value=1061.0):
+        assert cache.get("q", "br-pt", 10) is None
+    assert len(cache) == 0
+
+def test_search_cache_evicts_least_recently_used(tmp_path):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=float("inf"), max_entries=2)
+    with patch('caching.time.time', side_effect=[1.0, 2.0, 3.0, 4.0]):
+        cache.put("a", "br-pt", 10, [1])
+        cache.put("b", "br-pt", 10, [2])
+        cache.get("a", "br-pt", 10)  # "a" is now more recent than "b"
+        cache.put("c", "br-pt", 10, [3])
+    assert len(cache) == 2
+    assert cache.get("b", "br-pt", 10) is None
+    assert cache.get("a", "br-pt", 10) == [1]
+
+def test_search_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SearchCache(path).put("q", "br-pt", 10, [{"title": "T"}])
+    assert SearchCache(path).get("q", "br-pt", 10) == [{"title": "T"}]
+
+@pytest.mark.asyncio
+async def test_cached_backend_skips_network_on_hit(tmp_path):
+    inner = CountingBackend()
+    backend = CachedSearchBackend(inner, SearchCache(str(tmp_path / "cache.sqlite")))
+    first = await backend.search("capital França")
+    second = await backend.search("Capital França")
+    assert first == second
+    assert inner.calls == 1
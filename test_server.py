@@ -0,0 +1,112 @@
+import json
+import pytest
+import pytest_asyncio
+import asyncio
+from aiquery import SearchBotBase
+from bench_flow import FakeOllamaServer, RecordedSearchBackend
+from server import QueryServer, parse_address
+
+@pytest_asyncio.fixture
+async def api(monkeypatch):
+    ollama = await FakeOllamaServer(latency=0, tokens_per_sec=2000).start()
+    monkeypatch.setenv("OLLAMA_HOST", ollama.url)
+    monkeypatch.setenv("AIQUERY_LLM_CACHE_NODES", "")
+    monkeypatch.setenv("AIQUERY_SEARCH_CACHE", "")
+    monkeypatch.setenv("AIQUERY_ANSWER_CACHE_SIZE", "0")
+    bot = SearchBotBase()
+    bot.search_backend = RecordedSearchBackend(latency=0)
+    server = await QueryServer(bot, concurrency=2, max_pending=2).start(port=0)
+    try:
+        yield server
+    finally:
+        await server.shutdown(grace=1)
+        await ollama.stop()
+
+async def request(server, method, target, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(data)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload.decode()
+
+def test_parse_address():
+    assert parse_address("8000") == ("127.0.0.1", 8000)
+    assert parse_address(":8000") == ("127.0.0.1", 8000)
+    assert parse_address("0.0.0.0:9000") == ("0.0.0.0", 9000)
+
+@pytest.mark.asyncio
+async def test_query_returns_answer_with_timings(api):
+    status, payload = await request(api, "POST", "/query", {'query': "Qual a capital da França?"})
+    assert status == 200
+    result = json.loads(payload)
+    assert result['answer'] and result['iterations'] >= 1
+    assert {'querygen', 'search', 'answer'} <= set(result['timings'])
+    assert result['llm_calls'] >= 3
+
+@pytest.mark.asyncio
+async def test_stream_sends_progress_tokens_and_done(api):
+    status, payload = await request(api, "GET", "/stream?query=Qual%20a%20capital%20da%20Fran%C3%A7a%3F")
+    assert status == 200
+    events = [block.split("\n")[0].removeprefix("event: ") for block in payload.strip().split("\n\n")]
+    assert events[0] == "progress" and events[-1] == "done"
+    assert "start" in events and "token" in events
+    done = json.loads(payload.strip().split("\n\n")[-1].split("data: ", 1)[1])
+    tokens = [json.loads(block.split("data: ", 1)[1])['text']
+              for block in payload.strip().split("\n\n") if block.startswith("event: token")]
+    assert "".join(tokens).strip() == done['answer'].strip()
+
+@pytest.mark.asyncio
+async def test_bad_requests(api):
+    assert (await request(api, "POST", "/query", {'fanout': 2}))[0] == 400
+    assert (await request(api, "GET", "/query"))[0] == 405
+    assert (await request(api, "GET", "/nope"))[0] == 404
+    for deadline in ("inf", "nan", float("inf"), -1):
+        assert (await request(api, "POST", "/query", {'query': "q", 'deadline': deadline}))[0] == 400
+    status, payload = await request(api, "GET", "/health")
+    assert status == 200 and json.loads(payload)['status'] == "ok"
+
+@pytest.mark.asyncio
+async def test_overload_is_rejected(api):
+    api.pending = api.max_pending
+    status, payload = await request(api, "POST", "/query", {'query': "x"})
+    assert status == 503
+    api.pending = 0
+
+@pytest.mark.asyncio
+async def test_shutdown_lets_running_queries_finish(api):
+    query = asyncio.create_task(request(api, "POST", "/query", {'query': "Qual a capital da França?"}))
+    while api._active == 0:
+        await asyncio.sleep(0.01)
+    await api.shutdown(grace=10)
+    status, payload = await query
+    assert status == 200 and json.loads(payload)['answer']
+    with pytest.raises(OSError):
+        await asyncio.open_connection("127.0.0.1", api.port)
+
+@pytest.mark.asyncio
+async def test_session_keeps_the_conversation(api):
+    await request(api, "POST", "/query", {'query': "Qual a capital da França?", 'session': "abc"})
+    status, _ = await request(api, "POST", "/query", {'query': "E da Itália?", 'session': "abc"})
+    assert status == 200
+    turns, snippets = api.bot.session_memory.recall("abc")
+    assert [q for q, _ in turns] == ["Qual a capital da França?", "E da Itália?"] and snippets
+    assert (await request(api, "POST", "/query", {'query': "q", 'session': "x" * 200}))[0] == 400
+
+@pytest.mark.asyncio
+async def test_metrics_include_the_bot_gauges(api):
+    status, payload = await request(api, "GET", "/metrics")
+    assert status == 200
+    assert "aiquery_coalesced_queries 0" in payload and "aiquery_sessions " in payload
+
+@pytest.mark.asyncio
+async def test_bad_content_length_gets_400(api):
+    reader, writer = await asyncio.open_connection("127.0.0.1", api.port)
+    writer.write(b"POST /query HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    assert raw.startswith(b"HTTP/1.1 400")
@@ -0,0 +1,107 @@
+import sys
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from caching import SessionMemory
+from aiquery import SearchBotBase, QueryGenNode, new_shared, run_flow
+from ranking import SnippetStore
+
+def snippet(n):
+    return f"Result: Clima em Londres dia {n} - previsão de chuva e {n} graus"
+
+def test_follow_up_recalls_turns_and_snippets_most_reused_first():
+    memory = SessionMemory()
+    assert memory.recall("s1") == ([], [])
+    memory.remember("s1", "Clima em Londres hoje?", "Chuva, 12 graus.", [snippet(1), snippet(2)])
+    memory.remember("s1", "E amanhã?", "Sol, 15 graus.", [snippet(2), snippet(3)])
+    turns, snippets = memory.recall("s1")
+    assert turns == [("Clima em Londres hoje?", "Chuva, 12 graus."), ("E amanhã?", "Sol, 15 graus.")]
+    assert snippets == [snippet(2), snippet(3), snippet(1)]  # Reused, then most recent
+    assert memory.recall("s2") == ([], [])
+
+def test_snippets_are_interned_across_sessions():
+    memory = SessionMemory()
+    text = snippet(1)
+    memory.remember("s1", "q", "a", [text])
+    before = memory.bytes
+    memory.remember("s2", "q", "a", ["".join(list(text))])  # Equal, but another object
+    assert memory.bytes == before + sys.getsizeof("q") + sys.getsizeof("a")
+    assert memory.recall("s1")[1][0] is memory.recall("s2")[1][0]
+    assert memory.stats()['snippets'] == 1
+
+def test_session_byte_cap_drops_least_useful_snippets_then_old_turns():
+    cap = 4 * sys.getsizeof(snippet(1)) + 2 * sys.getsizeof("q") + 2 * sys.getsizeof("a")
+    memory = SessionMemory(session_bytes=cap)
+    memory.remember("s", "q", "a", [snippet(1), snippet(2), snippet(3)])
+    memory.remember("s", "q", "a", [snippet(1), snippet(4), snippet(5)])
+    _, snippets = memory.recall("s")
+    # snippet(1) was reused; the oldest unused one goes first
+    assert snippet(1) in snippets and snippet(2) not in snippets and len(snippets) == 4
+    assert memory._sessions["s"].bytes <= cap
+
+    memory = SessionMemory(session_bytes=int(1.5 * (sys.getsizeof("q") + sys.getsizeof("x" * 100))))
+    for _ in range(4):
+        memory.remember("s", "q", "x" * 100, [])
+    assert len(memory.recall("s")[0]) == 1
+
+def test_turns_are_bounded_and_answers_truncated():
+    memory = SessionMemory(max_turns=2, max_answer_chars=10)
+    for n in range(4):
+        memory.remember("s", f"q{n}", "a" * 50, [])
+    turns, _ = memory.recall("s")
+    assert [q for q, _ in turns] == ["q2", "q3"] and turns[0][1] == "a" * 10
+
+def test_global_cap_evicts_least_recently_active_sessions():
+    size = sys.getsizeof(snippet(1)) + sys.getsizeof("q") + sys.getsizeof("a")
+    memory = SessionMemory(max_bytes=int(2.5 * size))
+    memory.remember("old", "q", "a", [snippet(1)])
+    memory.remember("recent", "q", "a", [snippet(2)])
+    memory.recall("old")  # "old" is active again
+    memory.remember("new", "q", "a", [snippet(3)])
+    assert memory.recall("recent") == ([], [])
+    assert len(memory) == 2 and memory.evicted_sessions == 1
+    assert memory.bytes <= memory.max_bytes
+
+    memory.forget("old")
+    memory.forget("new")
+    assert memory.bytes == 0 and memory.stats()['snippets'] == 0
+
+@pytest.mark.asyncio
+async def test_follow_up_question_reuses_the_session(mocker, monkeypatch):
+    monkeypatch.setenv("AIQUERY_SEARCH_CACHE", "")
+    bot = SearchBotBase()
+    bot.embed = AsyncMock(return_value=None)
+    flow = mocker.patch('aiquery.build_flow')
+    async def run_async(shared):
+        store = SnippetStore(shared.get('ranking_query') or shared['user_query'], history=shared.get('history'))
+        store.add(snippet(len(store) + 1))
+        shared['snippets'] = store
+        shared['answer'] = f"answer to {shared['user_query']}"
+    flow.return_value.run_async = run_async
+
+    first = new_shared(bot, "Clima em Londres hoje?", session="s1")
+    assert 'conversation' not in first
+    await run_flow(first)
+
+    follow_up = new_shared(bot, "E amanhã?", session="s1")
+    assert follow_up['conversation'] == [("Clima em Londres hoje?", "answer to Clima em Londres hoje?")]
+    assert follow_up['history'] == [snippet(1)]
+    assert follow_up['ranking_query'] == "Clima em Londres hoje? E amanhã?"
+    await run_flow(follow_up)
+    assert follow_up['snippets'].history == [snippet(1), snippet(2)]
+    # Follow-ups are neither answered from nor added to the answer cache
+    assert bot.answer_cache.get("E amanhã?") is None
+    assert len(bot.session_memory.recall("s1")[0]) == 2
+
+    # Another conversation does not see it
+    assert 'conversation' not in new_shared(bot, "E amanhã?", session="s2")
+
+@pytest.mark.asyncio
+async def test_query_generation_sees_the_conversation(capsys):
+    bot = MagicMock()
+    bot.client.generate = AsyncMock(return_value={'response': "previsão do tempo Londres amanhã"})
+    shared = {'bot': bot, 'user_query': "E amanhã?", 'iteration': 0,
+              'conversation': [("Clima em Londres hoje?", "Chuva, 12 graus.")]}
+    await QueryGenNode().exec_async(shared)
+    prompt = bot.client.generate.call_args.kwargs['prompt']
+    assert "Q: Clima em Londres hoje?\nA: Chuva, 12 graus." in prompt
+    assert shared['search_query'] == "previsão do tempo Londres amanhã"
@@ -0,0 +1,56 @@
+from ranking import SnippetStore
+from aiquery import SearchBotBase
+
+def test_store_cleans_and_dedups_on_ingest():
+    store = SnippetStore("temperatura São Paulo")
+    added = store.ingest(["Result: Tempo - 21.9º", "Result: Tempo - 21.9º", "Result: Sol"], "tempo")
+    assert added == 2
+    assert store.history == ["Result: Tempo - 21.9 graus", "Result: Sol"]
+    assert "Result: Tempo - 21.9º" in store
+    assert store.add("Result: Tempo - 21.9 graus") is False
+
+def test_store_top_matches_rank_context():
+    query = "ganhador oscar 2024"
+    snippets = [
+        "Result: Cinema - Notícias de Hollywood.",
+        "Result: Previsão tempo - 25 graus.",
+        "Result: Oscar 2024 - 'Oppenheimer' leva melhor filme.",
+        "Result: Oscar - cerimônia anual.",
+        "Result: Ganhador do Oscar 2024 anunciado.",
+        "Result: Política - eleições.",
+        "Result: Economia - juros.",
+    ]
+    store = SnippetStore(query)
+    for snip in snippets:
+        store.add(snip)
+    assert store.top() == SearchBotBase().rank_context(query, snippets)
+
+def test_store_keeps_top_k_bounded():
+    store = SnippetStore("palmeiras", top_k=2, max_distance=None)
+    for i in range(50):
+        store.add(f"Result: Notícia {i}")
+    store.add("Result: Palmeiras vence")
+    assert len(store) == 51
+    assert store.top() == ["Result: Palmeiras vence", "Result: Notícia 0"]
+
+OPPENHEIMER = (
+    "Result: Oscar 2024 - O filme de Christopher Nolan venceu o Oscar de melhor filme "
+    "na cerimônia realizada neste domingo em Los Angeles, com sete estatuetas."
+)
+OPPENHEIMER_TRUNCATED = (
+    "Result: Oscar 2024 | G1 - O filme de Christopher Nolan venceu o Oscar de melhor filme "
+    "na cerimônia realizada neste domingo em Los Angeles, com sete..."
+)
+
+def test_store_rejects_near_duplicates():
+    store = SnippetStore("oscar 2024")
+    assert store.add(OPPENHEIMER) is True
+    assert store.add(OPPENHEIMER_TRUNCATED) is False
+    assert store.add("Result: Clima em Londres - Previsão de chuva e 12 graus para amanhã.") is True
+    assert store.near_duplicates == 1
+    assert len(store) == 2
+
+def test_near_duplicate_threshold_is_tunable():
+    store = SnippetStore("oscar 2024", max_distance=0)
+    store.add(OPPENHEIMER)
+    assert store.add(OPPENHEIMER_TRUNCATED) is True
@@ -0,0 +1,80 @@
+import gc
+import pytest
+import asyncio
+import time
+from unittest.mock import MagicMock
+from aiquery import build_flow, SearchBackend
+
+class StaticBackend(SearchBackend):
+    async def search(self, query, region='br-pt', max_results=10):
+        return [{"title": "Paris", "body": "Paris é a capital da França"}]
+
+class FakeStream:
+    """Streams answer chunks slowly and records whether it was closed."""
+    def __init__(self, text, delay):
+        self.chunks = text.split(" ")
+        self.delay = delay
+        self.closed = False
+    def __aiter__(self):
+        return self
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)
+        return {"response": self.chunks.pop(0) + " "}
+    async def aclose(self):
+        self.closed = True
+
+def make_bot(relevance_answers, delay=0.05):
+    bot = MagicMock()
+    bot.search_backend = StaticBackend()
+    bot.streams = []
+    relevance = list(relevance_answers)
+
+    async def generate(model, prompt, stream=False, node=None, **kwargs):
+        if node == 'answer':
+            bot.streams.append(FakeStream("Paris é a capital", delay))
+            return bot.streams[-1]
+        await asyncio.sleep(delay * 4)
+        if node == 'relevance':
+            return {"response": relevance.pop(0)}
+        if node == 'review':
+            return {"response": "9"}
+        return {"response": "capital França"}
+
+    bot.client.generate = generate
+    return bot
+
+def make_shared(bot, speculative):
+    return {'bot': bot, 'user_query': "Qual a capital da França?", 'iteration': 0,
+            'history': [], 'speculative': speculative}
+
+@pytest.mark.asyncio
+async def test_speculative_answer_overlaps_relevance(capsys):
+    timings = {}
+    for speculative in (False, True):
+        bot = make_bot(["YES"])
+        shared = make_shared(bot, speculative)
+        # A full collection of the mocks left by earlier tests can take ~0.1s
+        gc.collect()
+        start = time.perf_counter()
+        await build_flow().run_async(shared)
+        timings[speculative] = time.perf_counter() - start
+        assert shared['answer'] == "Paris é a capital "
+        assert 'speculation_gate' not in shared
+    # The answer stream (4 x 50ms) ran while relevance (200ms) was checked
+    assert timings[True] < timings[False] - 0.1
+
+@pytest.mark.asyncio
+async def test_discarded_speculation_closes_stream(capsys):
+    bot = make_bot(["NO", "YES"], delay=0.1)
+    shared = make_shared(bot, True)
+    await build_flow().run_async(shared)
+
+    assert shared['iteration'] == 2
+    assert len(bot.streams) == 2
+    first, second = bot.streams
+    assert first.closed and first.chunks  # cancelled mid-stream
+    assert second.closed and not second.chunks
+    # Output of the discarded answer was never shown
+    assert capsys.readouterr().out.count("Paris é a capital") == 1
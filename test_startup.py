@@ -0,0 +1,32 @@
+import os
+import sys
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative import time budget for `import aiquery`, in microseconds
+IMPORT_BUDGET_US = 400_000
+
+HEAVY_MODULES = ("ollama", "ddgs", "httpx", "numpy", "dotenv", "gradio", "http.server")
+
+def run_python(*args, cwd=HERE):
+    return subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True, check=True)
+
+def test_import_time_within_budget():
+    result = run_python("-X", "importtime", "-c", "import aiquery")
+    # Lines look like "import time:   self |  cumulative | module"
+    times = {}
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[1].isdigit():
+            times[parts[2]] = int(parts[1])
+    assert times["aiquery"] < IMPORT_BUDGET_US, f"import aiquery took {times['aiquery'] / 1000:.0f} ms"
+
+def test_import_defers_heavy_dependencies():
+    result = run_python("-c", f"import sys, aiquery; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    assert result.stdout.strip() == "[]"
+
+def test_version_has_no_side_effects(tmp_path):
+    result = run_python(os.path.join(HERE, "aiquery.py"), "--version", cwd=tmp_path)
+    assert "AiQuery" in result.stdout
+    assert not (tmp_path / "aiquery.log").exists()
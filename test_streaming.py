@@ -0,0 +1,43 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+from aiquery import AnswerNode, TokenStream
+
+async def fake_stream(*chunks):
+    for chunk in chunks:
+        yield {"response": chunk}
+
+@pytest.mark.asyncio
+async def test_answer_node_publishes_tokens(capsys):
+    bot = MagicMock()
+    bot.client.generate = AsyncMock(return_value=fake_stream("Paris ", "é ", "a capital."))
+    tokens = TokenStream()
+    shared = {'bot': bot, 'user_query': "Qual a capital da França?", 'context': "Paris", 'tokens': tokens}
+
+    await AnswerNode().exec_async(shared)
+    tokens.close()
+
+    events = [event async for event in tokens]
+    assert events == [('start', ''), ('token', "Paris "), ('token', "é "), ('token', "a capital.")]
+    assert shared['answer'] == "Paris é a capital."
+
+@pytest.mark.asyncio
+async def test_chat_interface_streams_partial_answers(mocker):
+    import app
+
+    async def fake_run_agent(question, progress, tokens, **options):
+        for kind, text in [('start', ''), ('token', "Resposta "), ('start', ''), ('token', "Paris"), ('token', " é a capital")]:
+            tokens.put(kind, text)
+            await asyncio.sleep(0)
+        return "Paris é a capital"
+
+    mocker.patch('app.run_agent', side_effect=fake_run_agent)
+    outputs = [out async for out in app.chat_interface("Qual a capital da França?", progress=MagicMock())]
+    # The retry ('start') discards the first attempt, then the answer grows token by token
+    assert outputs == ["Resposta ", "Paris", "Paris é a capital", "Paris é a capital"]
+
+@pytest.mark.asyncio
+async def test_chat_interface_rejects_empty_question():
+    import app
+    outputs = [out async for out in app.chat_interface("   ", progress=MagicMock())]
+    assert outputs == ["Please enter a question."]
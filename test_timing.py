@@ -7,7 +7,7 @@ from aiquery import main
 @pytest.mark.asyncio
 async def test_main_with_timing(mocker):
     # Mock dependencies to isolate CLI timing logic
-    mock_args = MagicMock(timestamp=True, gui=False, query=None)
+    mock_args = MagicMock(timestamp=True, gui=False, serve=None, batch=None, deadline=None, trace=False, trace_file=None, warmup=False, log_file=None, log_level=None, log_format=None, query=None)
     mocker.patch('aiquery.argparse.ArgumentParser.parse_args', return_value=mock_args)
     mocker.patch('aiquery.input', return_value="capital france")
     mocker.patch('aiquery.SearchBotBase', return_value=MagicMock())
@@ -31,7 +31,7 @@ async def test_main_with_timing(mocker):
 @pytest.mark.asyncio
 async def test_main_without_timing(mocker):
     # Mock dependencies
-    mock_args = MagicMock(timestamp=False, gui=False, query=None)
+    mock_args = MagicMock(timestamp=False, gui=False, serve=None, batch=None, deadline=None, trace=False, trace_file=None, warmup=False, log_file=None, log_level=None, log_format=None, query=None)
     mocker.patch('aiquery.argparse.ArgumentParser.parse_args', return_value=mock_args)
     mocker.patch('aiquery.input', return_value="capital france")
     mocker.patch('aiquery.SearchBotBase', return_value=MagicMock())
@@ -0,0 +1,60 @@
+import json
+import urllib.request
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from aiquery import QueryGenNode, RelevanceNode
+from telemetry import Trace, Metrics, start_metrics_server
+
+OLLAMA_STATS = {
+    "response": "YES", "prompt_eval_count": 120, "prompt_eval_duration": 400_000_000,
+    "eval_count": 20, "eval_duration": 500_000_000, "load_duration": 2_000_000_000,
+    "total_duration": 3_000_000_000,
+}
+
+@pytest.mark.asyncio
+async def test_node_runs_become_spans_with_llm_stats():
+    bot = MagicMock()
+    bot.model = "llama3.2:1B"
+    bot.client.generate = AsyncMock(return_value=OLLAMA_STATS)
+    trace = Trace("Qual a capital da França?")
+    shared = {'bot': bot, 'user_query': "Qual a capital da França?", 'iteration': 0, 'trace': trace}
+
+    await QueryGenNode()._run_async(shared)
+    await RelevanceNode()._run_async(shared)
+
+    assert [(s.node, s.iteration, s.action) for s in trace.spans] == [("querygen", 1, "default"), ("relevance", 1, "success")]
+    assert all(s.duration >= 0 for s in trace.spans)
+    call = trace.llm_calls[0]
+    assert call['node'] == "querygen" and call['model'] == "llama3.2:1B"
+    assert call['prompt_eval_count'] == 120 and call['tokens_per_sec'] == 40.0
+    assert "querygen" in trace.report()
+
+def test_trace_jsonl_export(tmp_path):
+    trace = Trace("q")
+    span = trace.start_span("search", 1)
+    trace.end_span(span, "default")
+    trace.record_llm("answer", "m", {**OLLAMA_STATS, "cached": True})
+    path = tmp_path / "trace.jsonl"
+    trace.write_jsonl(str(path))
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [e['type'] for e in events] == ["trace", "span", "llm"]
+    assert events[1]['node'] == "search" and events[2]['cached'] is True
+
+def test_metrics_prometheus_endpoint():
+    metrics = Metrics()
+    trace = Trace("q")
+    trace.end_span(trace.start_span("search", 1), "default")
+    trace.record_llm("answer", "m", OLLAMA_STATS)
+    metrics.observe(trace)
+    metrics.sources.append(lambda: {'aiquery_ollama_waiting': 2})
+
+    server = start_metrics_server(0, host="127.0.0.1", metrics=metrics)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+    assert 'aiquery_node_runs_total{node="search"} 1' in body
+    assert 'aiquery_llm_completion_tokens_total{node="answer",model="m"} 20' in body
+    assert "aiquery_ollama_waiting 2" in body
@@ -0,0 +1,76 @@
+import pytest
+import asyncio
+import threading
+from unittest.mock import MagicMock, AsyncMock
+import aiquery
+from aiquery import OllamaClient, SearchBotBase, parse_keep_alive
+from bench_flow import FakeOllamaServer
+
+def test_parse_keep_alive():
+    assert parse_keep_alive("") is None
+    assert parse_keep_alive("-1") == -1
+    assert parse_keep_alive("300") == 300
+    assert parse_keep_alive(" 30m ") == "30m"
+
+@pytest.mark.asyncio
+async def test_keep_alive_sent_on_every_call():
+    inner = MagicMock()
+    inner.generate = AsyncMock(return_value={'response': "ok"})
+    client = OllamaClient(inner, keep_alive="30m")
+    await client.generate(model="m", prompt="p", node="answer")
+    await client.warm_up("m")
+    assert [c.kwargs['keep_alive'] for c in inner.generate.call_args_list] == ["30m", "30m"]
+    assert inner.generate.call_args.kwargs['prompt'] == ""
+
+@pytest.mark.asyncio
+async def test_bot_warm_up_never_raises(monkeypatch):
+    bot = SearchBotBase()
+    bot.client = MagicMock()
+    bot.client.warm_up = AsyncMock(side_effect=ConnectionError("refused"))
+    assert await bot.warm_up() is False
+    bot.client.warm_up = AsyncMock(return_value={'load_duration': 2_000_000_000})
+    assert await bot.warm_up() is True
+
+@pytest.mark.asyncio
+async def test_keep_warm_repeats_until_stopped(monkeypatch):
+    server = await FakeOllamaServer(latency=0).start()
+    try:
+        monkeypatch.setenv("OLLAMA_HOST", server.url)
+        monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "10m")
+        stop = SearchBotBase().start_keep_warm(interval=0.05)
+        await asyncio.sleep(0.3)
+        stop.set()
+        assert server.calls >= 2
+    finally:
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_cli_warms_up_while_reading_the_question(mocker):
+    started = threading.Event()
+    seen_while_typing = []
+    bot = MagicMock(model="m")
+
+    async def warm_up():
+        started.set()
+        return True
+    bot.warm_up = warm_up
+
+    def fake_input(prompt):
+        # The event loop keeps running while the user types
+        seen_while_typing.append(started.wait(timeout=2))
+        return "capital da frança"
+
+    mocker.patch('aiquery.argparse.ArgumentParser.parse_args', return_value=MagicMock(
+        timestamp=False, gui=False, serve=None, batch=None, deadline=None, trace=False, trace_file=None, warmup=True,
+        log_file=None, log_level=None, log_format=None, query=None
+    ))
+    mocker.patch('aiquery.SearchBotBase', return_value=bot)
+    mocker.patch('aiquery.input', side_effect=fake_input, create=True)
+    flow = MagicMock()
+    flow.run_async = AsyncMock()
+    mocker.patch('aiquery.build_flow', return_value=flow)
+
+    await aiquery.main()
+
+    assert seen_while_typing == [True]
+    flow.run_async.assert_awaited_once()